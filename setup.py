@@ -24,13 +24,18 @@ setup(
     install_requires=[
         'bs4', 'click', 'jax', 'jaxlib', 'lxml', 'numpy', 'pandas', 'requests', 'scipy'
     ],
-    python_requires='>=3.6',
+    extras_require={
+        'duckdb': ['duckdb']
+    },
+    python_requires='>=3.9',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha'
         'Intended Audience :: Science/Research'
         'License :: OSI Approved :: Boost Software License 1.0 (BSL-1.0)'
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
 )
@@ -1 +1 @@
-from kleier.utils import get_dataset_names, load_dataset
+from kleier.utils import get_dataset_names, load_dataset, load_index, load_array, share_datasets, attach_datasets, load_shared_dataset
@@ -3,22 +3,108 @@
 #    (See accompanying file LICENSE_1_0.txt or copy at
 #          http://www.boost.org/LICENSE_1_0.txt)
 
+import contextlib
 import os
 import pkg_resources
+from multiprocessing import shared_memory
+from typing import Dict, Iterator
 
+import numpy as np
 import pandas as pd
 
 def get_data_home() -> str:
     return os.path.join(os.pardir, os.pardir, 'data', 'pkl')
 
-def _get_resource(basename: str) -> str:
-    return pkg_resources.resource_filename(__name__, os.path.join(get_data_home(), basename))
+def get_index_home() -> str:
+    return os.path.join(os.pardir, os.pardir, 'data', 'idx')
+
+def _get_resource(basename: str, home: str = None) -> str:
+    return pkg_resources.resource_filename(__name__, os.path.join(home or get_data_home(), basename))
 
 def get_dataset_names() -> list:
     return [
         os.path.splitext(df)[0]
         for df in pkg_resources.resource_listdir(__name__, get_data_home())
+        if df.endswith('.pkl')
     ]
 
 def load_dataset(name: str, **kws) -> pd.DataFrame:
     return pd.read_pickle(_get_resource(name + '.pkl'), **kws)
+
+def load_index(name: str, **kws):
+    return pd.read_pickle(_get_resource(name + '.pkl', get_index_home()), **kws)
+
+def load_array(name: str, mmap_mode: str = 'r', **kws) -> np.ndarray:
+    # e.g. the ratings_matrix, ratings_matrix_pid and ratings_matrix_eid arrays, memory-mapped by default
+    return np.load(_get_resource(name + '.npy', get_index_home()), mmap_mode=mmap_mode, **kws)
+
+# The columns of a dataset are published once in shared memory by the parent process, and worker processes
+# attach to them by name as read-only zero-copy DataFrames. Object columns are shared as categorical codes, whose
+# categories are pickled along with the spec, and nullable integer columns as their values and missing mask.
+_blocks = {}
+_shared = {}
+
+def _share_array(array: np.ndarray, blocks: list) -> tuple:
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+def _share_column(column: pd.Series, blocks: list) -> tuple:
+    if column.dtype == object:
+        column = column.astype('category')
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return 'categorical', (_share_array(column.cat.codes.to_numpy(), blocks),), column.dtype
+    if pd.api.types.is_extension_array_dtype(column.dtype) and hasattr(column.dtype, 'numpy_dtype'):
+        values = column.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0)
+        return 'masked', (_share_array(values, blocks), _share_array(column.isna().to_numpy(), blocks)), column.dtype
+    if pd.api.types.is_extension_array_dtype(column.dtype):
+        raise TypeError(f'Cannot share a column of dtype {column.dtype}')
+    return 'numpy', (_share_array(column.to_numpy(), blocks),), column.dtype
+
+def _share_frame(df: pd.DataFrame, blocks: list) -> dict:
+    return {
+        'index'  : df.index if isinstance(df.index, pd.RangeIndex) else _share_column(df.index.to_series(), blocks),
+        'columns': {column: _share_column(df[column], blocks) for column in df.columns}
+    }
+
+@contextlib.contextmanager
+def share_datasets(*names: str, **kws) -> Iterator[Dict[str, dict]]:
+    # the picklable specs of the shared datasets, whose memory is released when the with block is left
+    blocks = []
+    try:
+        yield {name: _share_frame(load_dataset(name, **kws), blocks) for name in names}
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+def _attach_array(name: str, shape: tuple, dtype: str) -> np.ndarray:
+    # the blocks of a worker process are kept open for its lifetime, since the DataFrames are views of them
+    if name not in _blocks:
+        _blocks[name] = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, np.dtype(dtype), buffer=_blocks[name].buf)
+    array.flags.writeable = False
+    return array
+
+def _attach_column(kind: str, arrays: tuple, dtype):
+    if kind == 'categorical':
+        return pd.Categorical.from_codes(_attach_array(*arrays[0]), dtype=dtype)
+    if kind == 'masked':
+        return dtype.construct_array_type()(*(_attach_array(*array) for array in arrays), copy=False)
+    return _attach_array(*arrays[0])
+
+def attach_dataset(spec: dict) -> pd.DataFrame:
+    return pd.DataFrame(
+        {column: _attach_column(*column_spec) for column, column_spec in spec['columns'].items()},
+        index=spec['index'] if isinstance(spec['index'], pd.Index) else pd.Index(_attach_column(*spec['index']), copy=False),
+        copy=False
+    )
+
+def attach_datasets(specs: Dict[str, dict]) -> None:
+    # e.g. as the initializer of a process pool, with the specs yielded by share_datasets
+    _shared.update({name: attach_dataset(spec) for name, spec in specs.items()})
+
+def load_shared_dataset(name: str) -> pd.DataFrame:
+    return _shared[name]
@@ -0,0 +1,363 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import math
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.stats as ss
+
+from scripts._transform import compute
+
+# the approximate size of the real archive at scale = 1
+real_events  = 1200
+real_players = 2400
+
+nationalities = ['NED', 'GER', 'BEL', 'GBR', 'ITA', 'FRA', 'DEN', 'AUT', 'USA', 'ESP']
+places        = ['Amsterdam', 'Berlin', 'Brussels', 'London', 'Rome', 'Paris', 'Copenhagen', 'Vienna', 'Boston', 'Madrid']
+syllables     = ['ka', 'ro', 'mi', 'ten', 'vo', 'li', 'sa', 'dor', 'be', 'nu', 'gar', 'te', 'wil', 'han', 'jo', 'ste']
+
+# Elo (1978) notation, with the Kleier normal distribution for the expected score
+s_norm = 200 * np.sqrt(2)
+K      = 20
+
+def _player_names(rng: np.random.Generator, P: int) -> List[Tuple[str, str]]:
+    # unique by construction: the surname encodes the pid in base len(syllables)
+    def word(n: int) -> str:
+        w = ''
+        while True:
+            n, r = divmod(n, len(syllables))
+            w += syllables[r]
+            if not n:
+                return w.capitalize()
+    return [
+        (word(int(rng.integers(0, len(syllables)**2))), word(pid) + 'son')
+        for pid in range(1, P + 1)
+    ]
+
+def _round_robin(players: np.ndarray) -> List[List[Tuple[int, int]]]:
+    # the circle method, with 0 as the bye for an odd number of players
+    p = list(players) + ([0] if len(players) % 2 else [])
+    n = len(p)
+    rounds = []
+    for _ in range(n - 1):
+        rounds.append([(p[i], p[n - 1 - i]) for i in range(n // 2)])
+        p = [p[0]] + [p[-1]] + p[1:-1]
+    return rounds
+
+def _swiss(rng: np.random.Generator, players: np.ndarray, N: int) -> List[List[Tuple[int, int]]]:
+    rounds = []
+    for _ in range(N):
+        p = list(rng.permutation(players)) + ([0] if len(players) % 2 else [])
+        rounds.append([(p[i], p[i + 1]) for i in range(0, len(p), 2)])
+    return rounds
+
+def _tie_breaks(games: pd.DataFrame, points: Dict[float, int]) -> pd.DataFrame:
+    # score, median-Buchholz, Buchholz and direct-match results (among players with an equal score)
+    pid1, pid2, W = games.pid1.to_numpy(), games.pid2.to_numpy(), games.W.to_numpy()
+    pid = np.unique(pid1)
+    M = len(pid)
+    i1 = np.searchsorted(pid, pid1)
+    pts = np.select([W == 1.0, W == 0.5, W == 0.0], [points[1.0], points[0.5], points[0.0]], 0)
+    score = np.bincount(i1, pts, M).astype(int)
+    played = pid2 != 0
+    j1, j2, pts = i1[played], np.searchsorted(pid, pid2[played]), pts[played]
+    opp = score[j2].astype(float)
+    buchholz = np.bincount(j1, opp, M)
+    hi, lo = np.full(M, -np.inf), np.full(M, np.inf)
+    np.maximum.at(hi, j1, opp)
+    np.minimum.at(lo, j1, opp)
+    median = np.where(np.bincount(j1, minlength=M) >= 3, buchholz - hi - lo, 0.0)
+    tied = score[j1] == score[j2]
+    dmr_W = np.bincount(j1[tied], pts[tied], M).astype(int)
+    dmr_N = np.bincount(j1[tied], minlength=M)
+    order = np.lexsort((pid, -dmr_W, -buchholz, -median, -score))
+    return pd.DataFrame({
+        'pid'     : pid[order],
+        'score'   : score[order],
+        'median'  : median[order],
+        'buchholz': buchholz[order],
+        'dmr_W'   : dmr_W[order],
+        'dmr_N'   : dmr_N[order],
+        'rank'    : np.arange(1, M + 1)
+    })
+
+def simulate(scale: float = 1.0, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    E = max(2, int(round(scale * real_events)))
+    P = max(8, int(round(scale * real_players)))
+    names = _player_names(rng, P)
+    players = (pd
+        .DataFrame({
+            'pid'     : np.arange(1, P + 1),
+            'pre'     : [pre for pre, _ in names],
+            'sur'     : [sur for _, sur in names],
+            'nat'     : rng.choice(nationalities, P),
+            'strength': rng.normal(1500, 200, P)
+        })
+    )
+    dates = pd.Timestamp('1990-01-01') + pd.to_timedelta(np.sort(rng.choice(np.arange(31 * 365), E, replace=False)), unit='D')
+    events = pd.DataFrame({
+        'eid'  : np.arange(1, E + 1),
+        'date' : dates,
+        'place': rng.choice(places, E),
+        'nat'  : rng.choice(nationalities, E)
+    })
+    events = events.assign(significance = compute.date_significance(events.date, events.date.max()))
+    strength = np.r_[0.0, players.strength.to_numpy()]
+    rating = np.full(P + 1, np.nan)
+    eff_games = np.zeros(P + 1)
+    unseen = list(rng.permutation(np.arange(1, P + 1)))
+    groups, standings, results, activity = [], [], [], []
+    for eid in events.eid:
+        G = 1 + int(rng.random() < 0.3) + int(rng.random() < 0.1)
+        pool = iter(rng.permutation(np.arange(1, P + 1)).tolist())
+        taken = set()
+        for gid in range(G):
+            M = int(rng.integers(4, 13))
+            # every player plays at least one event, as the real archive has no players without games
+            members = [unseen.pop() for _ in range(min(M, len(unseen)))]
+            taken.update(members)
+            for pid in pool:
+                if len(members) == M:
+                    break
+                if not pid in taken:
+                    members.append(pid)
+                    taken.add(pid)
+            members = np.array(members)
+            fmt = rng.choice(['RR1', 'RR2', 'SS'], p=[0.5, 0.1, 0.4])
+            rounds = (
+                _round_robin(members) if fmt == 'RR1' else
+                _round_robin(members) * 2 if fmt == 'RR2' else
+                _swiss(rng, members, int(rng.integers(3, max(4, M))))
+            )
+            score_W, score_D, score_L = (2, 1, 0) if rng.random() < 0.8 else (3, 1, 0)
+            points = {1.0: score_W, 0.5: score_D, 0.0: score_L}
+            games = []
+            for rnd, pairs in enumerate(rounds, 1):
+                for a, b in pairs:
+                    a, b = (a, b) if a else (b, a)
+                    if not b:
+                        games.append((rnd, a, 0, False, np.nan, ''))
+                        continue
+                    pa = 0.5 * (1.0 + math.erf((strength[a] - strength[b]) / (s_norm * math.sqrt(2))))
+                    u = rng.random()
+                    W = 1.0 if u < pa - 0.05 else 0.5 if u < pa + 0.05 else 0.0
+                    unplayed = bool(rng.random() < 0.01) and W != 0.5
+                    color = 'W' if rng.random() < 0.5 else 'B'
+                    games.append((rnd, a, b, unplayed, W, color))
+                    games.append((rnd, b, a, unplayed, 1.0 - W, 'B' if color == 'W' else 'W'))
+            games = pd.DataFrame(games, columns=['round', 'pid1', 'pid2', 'unplayed', 'W', 'color'])
+            groups.append({
+                'eid': eid, 'gid': gid, 'M': len(members), 'N': len(rounds),
+                'name': f'Open Championship {eid}' if rng.random() < 0.5 else np.nan,
+                'group': 'ABCDEFGH'[gid], 'score_W': score_W, 'score_D': score_D, 'score_L': score_L,
+                'file_from': f'Arbiter {eid}' if rng.random() < 0.2 else np.nan
+            })
+            standings.append(_tie_breaks(games, points).assign(eid = eid, gid = gid))
+            results.append(games.assign(eid = eid, gid = gid))
+        # a simple Elo update after each event, to give the rating history a realistic shape
+        event = pd.concat(results[-G:]).query('pid2 != 0 and not unplayed')
+        R = np.where(np.isnan(rating), 1500.0, rating)
+        We = ss.norm.cdf((R[event.pid1] - R[event.pid2]) / s_norm)
+        dR = pd.Series(K * (event.W.to_numpy() - We)).groupby(event.pid1.to_numpy()).sum()
+        for pid in sorted(taken):
+            old = rating[pid]
+            n = (event.pid1 == pid).sum()
+            eff_games[pid] += n
+            rating[pid] = np.round(R[pid] + dR.get(pid, 0.0))
+            activity.append((pid, eid, rating[pid], rating[pid] - old if not np.isnan(old) else np.nan, eff_games[pid]))
+    results = pd.concat(results, ignore_index=True)
+    # the current number of effective games decays with the significance of past events
+    significant = (results
+        .query('pid2 != 0 and not unplayed')
+        .merge(events.loc[:, ['eid', 'significance']], how='left', on='eid')
+        .groupby('pid1')
+        .significance
+        .sum()
+    )
+    return {
+        'players'  : players.assign(
+            R         = rating[1:],
+            eff_games = lambda x: np.round(x.pid.map(significant).fillna(0.0), 3)
+        ),
+        'events'   : events,
+        'groups'   : pd.DataFrame(groups),
+        'standings': pd.concat(standings, ignore_index=True),
+        'results'  : results,
+        'activity' : pd.DataFrame(activity, columns=['pid', 'eid', 'R', 'dR', 'eff_games'])
+    }
+
+# writers for the HTML layouts that _parse expects
+
+nbsp = '&nbsp;'
+
+def _tournaments(events: pd.DataFrame) -> str:
+    items = ''.join(
+        f'<li><span>{nat}</span><ul>' + ''.join(
+            f'<li><a href="../../cgi/tourn_table.php?eid={eid}">{place} {date:%Y-%m-%d}</a></li>'
+            for eid, place, date in zip(df.eid, df.place, df.date)
+        ) + '</ul></li>'
+        for nat, df in events.groupby('nat')
+    )
+    return f'<html><body><h1>Tournaments by place</h1><ul class="nat">{items}</ul></body></html>'
+
+def _result(rank2: int, W: float) -> str:
+    return f'{rank2}{"+=-"[int(2 * (1.0 - W))]}'
+
+def _cross_table(event, group, standings: pd.DataFrame, results: pd.DataFrame, players: pd.DataFrame, activity: pd.DataFrame) -> str:
+    N = group.N
+    C = 11 + N
+    title = f'{event.place} {event.date:%Y-%m-%d}'
+    if isinstance(group.name, str):
+        title = group.name + nbsp * 6 + title
+    rank = dict(zip(standings.pid, standings['rank']))
+    head = (
+        f'<tr><th colspan="{C}">{title}</th></tr>'
+        f'<tr><th colspan="{C}">Group: {group.group}:{nbsp * 2}Scoring: {group.score_W} {group.score_D} {group.score_L}</th></tr>'
+        '<tr><th rowspan="2">#</th><th rowspan="2">Surname</th><th rowspan="2">Prename</th><th rowspan="2">Nationality</th>'
+        f'<th colspan="3">Rating</th><th colspan="4">Standings</th><th colspan="{N}">Results</th></tr>'
+        '<tr><th>Value</th><th>Change</th><th>Eff.Games</th><th>Score</th><th>Median</th><th>Buchholz</th><th>Compa</th>' +
+        ''.join(f'<th>{n}</th>' for n in range(1, N + 1)) + '</tr>'
+    )
+    cells = {
+        (pid1, rnd): (
+            '<td></td>' if not pid2 else
+            f'<td class="unplayed">{_result(rank[pid2], W)}</td>' if unplayed else
+            f'<td>{_result(rank[pid2], W)}{color}</td>'
+        )
+        for rnd, pid1, pid2, unplayed, W, color in zip(results['round'], results.pid1, results.pid2, results.unplayed, results.W, results.color)
+    }
+    rows = ''
+    for s in standings.itertuples(index=False):
+        p, a = players.loc[s.pid], activity.loc[s.pid]
+        rows += (
+            f'<tr><td>{s.rank}</td><td class="name"><a href="player.php?pid={s.pid}">{p.sur}</a></td><td>{p.pre}</td><td>{p.nat}</td>'
+            f'<td>{a.R:.0f}</td><td>{"" if np.isnan(a.dR) else f"{a.dR:.0f}"}</td><td>{a.eff_games:g}</td>'
+            f'<td>{s.score}</td><td>{s.median:g}</td><td>{s.buchholz:g}</td><td>{f"{s.dmr_W}/{s.dmr_N}" if s.dmr_N else ""}</td>' +
+            ''.join(cells.get((s.pid, n), '<td></td>') for n in range(1, N + 1)) + '</tr>'
+        )
+    if isinstance(group.file_from, str):
+        rows += f'<tr><td colspan="{C}">Results from: {group.file_from} {event.date:%Y-%m-%d} results-{event.eid}-{group.gid}.txt</td></tr>'
+    return f'<table summary="Stratego Tournament Cross-Table"><thead>{head}</thead><tbody>{rows}</tbody></table>'
+
+def _tourn_table(event, groups: pd.DataFrame, standings: pd.DataFrame, results: pd.DataFrame, players: pd.DataFrame, activity: pd.DataFrame) -> str:
+    tables = ''.join(
+        _cross_table(event, group, standings[standings.gid == group.gid], results[results.gid == group.gid], players, activity) +
+        f'<pre>Remarks on group {group.group}</pre>'
+        for group in groups.itertuples(index=False)
+    )
+    return f'<html><body><h1>{event.place} {event.date:%Y-%m-%d}</h1>{tables}</body></html>'
+
+def _player(player, games: pd.DataFrame) -> str:
+    name = f'{player.pre} {player.sur}'
+    rows = ''.join(
+        f'<tr><td>{g.date:%Y-%m-%d}</td><td>{g.place}</td><td>{g.significance}</td>'
+        f'<td>{g.pre2}</td><td>{g.sur2}</td><td>{g.R2:.0f}</td>'
+        f'<td>{g.W:g}</td><td>{g.We:.2f}</td><td class="{"unplayed" if g.unplayed else "played"}">{g.dW:.2f}</td></tr>'
+        for g in games.itertuples(index=False)
+    )
+    table = (
+        f'<table summary="Game Balance of {name}"><thead>'
+        f'<tr><th colspan="9">Game Balance of {name}</th></tr>'
+        '<tr><th colspan="3">Event</th><th colspan="3">Opponent</th><th colspan="3">Result</th></tr>'
+        '<tr><th>Date</th><th>Place</th><th>Significance</th><th>Prename</th><th>Surname</th><th>Rating</th>'
+        '<th>Observed</th><th>Expected</th><th>Net Yield</th></tr>'
+        f'</thead><tbody>{rows}</tbody></table>'
+    )
+    return f'<html><body><h1>History of {name}</h1>{table}</body></html>'
+
+def _rat_table(dst, players: pd.DataFrame, events: pd.DataFrame, activity: pd.DataFrame) -> None:
+    # the most recent event comes first, and the players are sorted by their current rating,
+    # written one row at a time, since the table has one cell for every player and every event
+    events = events.iloc[::-1]
+    E = len(events.index)
+    dst.write(
+        '<html><body><h1>Stratego Rating</h1><table summary="Stratego Rating"><thead>'
+        '<tr><th colspan="2" rowspan="3">Ranking</th><th rowspan="4">Surname</th><th rowspan="4">Prename</th>'
+        f'<th colspan="{E}">Rating</th><th colspan="2" rowspan="3">Games</th></tr>' +
+        '<tr>' + ''.join(f'<th>{place}</th>' for place in events.place) + '</tr>' +
+        '<tr>' + ''.join(f'<th>{date:%Y-%m-%d}</th>' for date in events.date) + '</tr>' +
+        '<tr><th>Int.</th><th>Nat.</th>' + ''.join(f'<th>{significance}</th>' for significance in events.significance) +
+        '<th>Eff.</th><th>Tot.</th></tr></thead><tbody>'
+    )
+    ranked = (players
+        .sort_values(['R', 'pid'], ascending=[False, True])
+        .assign(
+            int_rank = lambda x: x.R.where(x.eff_games >= 5.0).rank(ascending=False, method='first'),
+            nat_rank = lambda x: x.R.where(x.eff_games >= 5.0).groupby(x.nat).rank(ascending=False, method='first')
+        )
+    )
+    position = pd.Series(np.arange(E), index=events.eid)
+    by_player = {
+        pid: (position[df.eid].to_numpy(), df.R.to_numpy())
+        for pid, df in activity.groupby('pid')
+    }
+    for p in ranked.itertuples(index=False):
+        # a rating is carried backwards in this newest-first order until the next event that the player played
+        pos, R = by_player[p.pid]
+        row = np.full(E, np.nan)
+        row[pos] = R
+        last = np.where(np.isnan(row), E, np.arange(E))
+        last = np.minimum.accumulate(last[::-1])[::-1]
+        row = np.where(last < E, row[np.minimum(last, E - 1)], np.nan)
+        dst.write(
+            f'<tr><td>{"-" if np.isnan(p.int_rank) else f"{p.int_rank:.0f}"}</td>'
+            f'<td>{"-" if np.isnan(p.nat_rank) else f"{p.nat_rank:.0f}"}/{p.nat}</td><td>{p.sur}</td><td>{p.pre}</td>' +
+            ''.join('<td>unrated</td>' if np.isnan(R) else f'<td>{R:.0f}</td>' for R in row) +
+            f'<td>{p.eff_games:g}</td><td>{p.tot_games}</td></tr>'
+        )
+    dst.write('</tbody></table></body></html>')
+
+def _write(path: str, file: str, html: str) -> None:
+    with open(os.path.join(path, file), 'w') as dst:
+        dst.write(html)
+
+def write(corpus: Dict[str, pd.DataFrame], path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    players, events, groups, standings, results, activity = tuple(
+        corpus[key]
+        for key in ['players', 'events', 'groups', 'standings', 'results', 'activity']
+    )
+    _write(path, 'tournaments.html', _tournaments(events))
+    by_event = {
+        key: dict(list(df.groupby('eid')))
+        for key, df in [('groups', groups), ('standings', standings), ('results', results), ('activity', activity)]
+    }
+    lookup = players.set_index('pid')
+    for event in events.itertuples(index=False):
+        _write(path, f'tourn_table-{event.eid}.html', _tourn_table(
+            event,
+            by_event['groups'][event.eid],
+            by_event['standings'][event.eid],
+            by_event['results'][event.eid],
+            lookup,
+            by_event['activity'][event.eid].set_index('pid')
+        ))
+    games = (results
+        .query('pid2 != 0')
+        .merge(events.loc[:, ['eid', 'date', 'place', 'significance']], how='left', on='eid')
+        .assign(
+            pre2 = lambda x: x.pid2.map(lookup.pre),
+            sur2 = lambda x: x.pid2.map(lookup.sur),
+            R2   = lambda x: x.pid2.map(lookup.R),
+            We   = lambda x: np.round(ss.norm.cdf((x.pid1.map(lookup.R) - x.R2) / s_norm), 2),
+            dW   = lambda x: np.round(x.W - x.We, 2)
+        )
+        .sort_values(['pid1', 'eid', 'round'])
+    )
+    by_player = dict(list(games.groupby('pid1')))
+    for player in players.itertuples(index=False):
+        _write(path, f'player-{player.pid}.html', _player(player, by_player.get(player.pid, games.iloc[:0])))
+    tot_games = results.query('pid2 != 0 and not unplayed').groupby('pid1').size()
+    with open(os.path.join(path, 'rat_table.html'), 'w') as dst:
+        _rat_table(
+            dst,
+            players.assign(tot_games = lambda x: x.pid.map(tot_games).fillna(0).astype(int)),
+            events,
+            activity
+        )
@@ -0,0 +1,115 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from scripts._extract import _scan
+from scripts._transform import _format
+from scripts._transform import _normalize
+from scripts._transform import _parse
+
+def _measure(fun: Callable, args: tuple, repeat: int, memory: bool) -> tuple:
+    # the best wall time over repeated runs, and the peak of the traced Python allocations in a separate run,
+    # since tracemalloc itself slows down the code under measurement
+    seconds = np.inf
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fun(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+    peak = None
+    if memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = fun(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def run(html_path: str, repeat: int = 1, memory: bool = True) -> List[dict]:
+    records = []
+    def measure(stage: str, name: str, fun: Callable, *args):
+        result, seconds, peak = _measure(fun, args, repeat, memory)
+        records.append({'stage': stage, 'function': name, 'seconds': seconds, 'peak_bytes': peak})
+        return result
+    measure('extract'  , '_scan._tourn_tables'     , _scan._tourn_tables     , html_path)
+    measure('extract'  , '_scan._players'          , _scan._players          , html_path)
+    tournaments = measure('parse', '_parse._tournaments', _parse._tournaments, html_path)
+    events, groups, activity, standings, results = measure('parse', '_parse._tourn_tables', _parse._tourn_tables, html_path)
+    names, expected = measure('parse', '_parse._players', _parse._players, html_path)
+    # the BeautifulSoup and read_html path is kept as a baseline for the streaming parser of the rating table
+    measure('parse', '_parse._rat_table_soup', _parse._rat_table_soup, html_path)
+    dates, ratings, history = measure('parse', '_parse._rat_table', _parse._rat_table, html_path)
+    tournaments = measure('format'   , '_format._tournaments'  , _format._tournaments  , tournaments)
+    events      = measure('format'   , '_format._events'       , _format._events       , events)
+    groups      = measure('format'   , '_format._groups'       , _format._groups       , groups)
+    activity    = measure('format'   , '_format._activity'     , _format._activity     , activity)
+    standings   = measure('format'   , '_format._standings'    , _format._standings    , standings)
+    results     = measure('format'   , '_format._results'      , _format._results      , results)
+    names       = measure('format'   , '_format._names'        , _format._names        , names)
+    expected    = measure('format'   , '_format._expected'     , _format._expected     , expected)
+    dates       = measure('format'   , '_format._dates'        , _format._dates        , dates)
+    ratings     = measure('format'   , '_format._ratings'      , _format._ratings      , ratings)
+    history     = measure('format'   , '_format._history'      , _format._history      , history)
+    tournaments = measure('normalize', '_normalize._tournaments', _normalize._tournaments, tournaments)
+    events      = measure('normalize', '_normalize._events'     , _normalize._events     , events)
+    groups      = measure('normalize', '_normalize._groups'     , _normalize._groups     , groups)
+    names       = measure('normalize', '_normalize._names'      , _normalize._names      , names, standings)
+    dates       = measure('normalize', '_normalize._dates'      , _normalize._dates      , dates)
+    ratings     = measure('normalize', '_normalize._ratings'    , _normalize._ratings    , ratings, names)
+    history     = measure('normalize', '_normalize._history'    , _normalize._history    , history, events, names)
+    activity    = measure('normalize', '_normalize._activity'   , _normalize._activity   , activity, names)
+    standings   = measure('normalize', '_normalize._standings'  , _normalize._standings  , standings, names)
+    results     = measure('normalize', '_normalize._results'    , _normalize._results    , results, standings)
+    expected    = measure('normalize', '_normalize._expected'   , _normalize._expected   , expected, events, names, dates, ratings, results)
+    return records
+
+def _load(history_file: str) -> List[dict]:
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file) as src:
+        return json.load(src)
+
+def record(history_file: str, records: List[dict], **info) -> pd.DataFrame:
+    # append this run to the JSON history, and compare it with the latest previous run at the same scale
+    runs = _load(history_file)
+    previous = next((
+        run
+        for run in reversed(runs)
+        if all(run.get(key) == value for key, value in info.items())
+    ), None)
+    runs.append({
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python'   : platform.python_version(),
+        'pandas'   : pd.__version__,
+        **info,
+        'records'  : records
+    })
+    os.makedirs(os.path.dirname(history_file) or os.curdir, exist_ok=True)
+    with open(history_file, 'w') as dst:
+        json.dump(runs, dst, indent=2)
+    df = pd.DataFrame(records)
+    if previous is None:
+        return df.assign(ratio = np.nan)
+    return (df
+        .merge(pd
+            .DataFrame(previous['records'])
+            .loc[:, ['function', 'seconds']]
+            .rename(columns={'seconds': 'previous'})
+            , how='left', on='function', validate='one_to_one'
+        )
+        .assign(ratio = lambda x: x.seconds / x.previous)
+        .drop(columns='previous')
+    )
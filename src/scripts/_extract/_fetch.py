@@ -3,33 +3,71 @@
 #    (See accompanying file LICENSE_1_0.txt or copy at
 #          http://www.boost.org/LICENSE_1_0.txt)
 
-import os
+import re
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def _do_fetch(directory_prefix: str, output_document: str, url) -> None:
-    os.makedirs(directory_prefix, exist_ok=True)
-    with open(os.path.join(directory_prefix, output_document), 'wb') as dst:
-        response = requests.get(url)
-        assert response.status_code == 200
-        dst.write(response.content)
+from scripts._extract import _manifest
+from scripts._extract import _store
 
-def _player(pid: int, path: str) -> None:
+base_url = 'https://www.kleier.net'
+
+# surname ranges [from_, till) that together cover the default rating table range ['A', '[')
+rat_table_shards = [
+    (chr(c), chr(c + 1))
+    for c in range(ord('A'), ord('Z') + 1)
+]
+
+# a shared session keeps connections alive, and retries transient server errors with exponential backoff
+_adapter = HTTPAdapter(max_retries=Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]))
+_session = requests.Session()
+_session.mount('http://' , _adapter)
+_session.mount('https://', _adapter)
+
+def _do_fetch(directory_prefix: str, output_document: str, url, manifest: dict = None) -> bytes:
+    # with a manifest, files that were fetched from the same url and still match their size and checksum are skipped
+    if manifest is not None and _manifest.verified(directory_prefix, output_document, url, manifest):
+        return _store.read(directory_prefix, output_document)
+    start = time.perf_counter()
+    response = _session.get(url)
+    seconds = time.perf_counter() - start
+    assert response.status_code == 200
+    _store.write(directory_prefix, output_document, response.content)
+    _manifest.append(directory_prefix, output_document, url, response.status_code, response.content, seconds)
+    return response.content
+
+def _player(pid: int, path: str, base_url=base_url, manifest: dict = None) -> bytes:
     file = f'player-{pid}.html'
-    url = f'https://www.kleier.net/cgi/player.php?pid={pid}'
-    _do_fetch(path, file, url)
+    url = f'{base_url}/cgi/player.php?pid={pid}'
+    return _do_fetch(path, file, url, manifest)
+
+def _rat_table(path: str, min=-9999, max=9999, from_='A', till='[', games=1, ntourn=12, items=2500, sortby='r', colsel=0, nat='all', base_url=base_url, manifest: dict = None, file='rat_table.html') -> bytes:
+    url = f'{base_url}/cgi/rat_table.php?min={min}&max={max}&from={from_}&till={till}&games={games}&ntourn={ntourn}&items={items}&sortby={sortby}&colsel={colsel}&nat[]={nat}'
+    return _do_fetch(path, file, url, manifest)
+
+def _rat_table_shard(from_: str, till: str, path: str, **kwargs) -> bytes:
+    return _rat_table(path, from_=from_, till=till, file=f'rat_table-{from_}.html', **kwargs)
 
-def _rat_table(path: str, min=-9999, max=9999, from_='A', till='[', games=1, ntourn=12, items=2500, sortby='r', colsel=0, nat='all') -> None:
-    file = 'rat_table.html'
-    url = f'https://www.kleier.net/cgi/rat_table.php?min={min}&max={max}&from={from_}&till={till}&games={games}&ntourn={ntourn}&items={items}&sortby={sortby}&colsel={colsel}&nat[]={nat}'
-    _do_fetch(path, file, url)
+def _rat_table_layout(path: str, shards: bool) -> None:
+    # the single page and the shards are two layouts of the same rating table, of which only the one that was
+    # fetched last is kept, so that stale pages of the other layout are never parsed instead of the fresh ones
+    stale = [
+        file
+        for file in _store.files(path)
+        if (re.match(r'rat_table-.+\.html$', file) if not shards else file == 'rat_table.html')
+    ]
+    for file in stale:
+        _store.remove(path, file)
 
-def _tourn_table(eid: int, path:str) -> None:
+def _tourn_table(eid: int, path:str, base_url=base_url, manifest: dict = None) -> bytes:
     file = f'tourn_table-{eid}.html'
-    url = f'https://www.kleier.net/cgi/tourn_table.php?eid={eid}'
-    _do_fetch(path, file, url)
+    url = f'{base_url}/cgi/tourn_table.php?eid={eid}'
+    return _do_fetch(path, file, url, manifest)
 
-def _tournaments(path: str) -> None:
+def _tournaments(path: str, base_url=base_url, manifest: dict = None) -> bytes:
     file = 'tournaments.html'
-    url = 'https://www.kleier.net/tournaments/byplace/index.php'
-    _do_fetch(path, file, url)
+    url = f'{base_url}/tournaments/byplace/index.php'
+    return _do_fetch(path, file, url, manifest)
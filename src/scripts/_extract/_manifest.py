@@ -0,0 +1,57 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from scripts._extract import _store
+
+# one JSON record per fetched file, appended after the file has been atomically stored
+manifest_file = 'manifest.jsonl'
+
+_lock = threading.Lock()
+
+def sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+def append(path: str, file: str, url: str, status: int, content: bytes, seconds: float) -> None:
+    record = {
+        'file'   : file,
+        'url'    : url,
+        'status' : status,
+        'size'   : len(content),
+        'sha256' : sha256(content),
+        'seconds': round(seconds, 6),
+        'fetched': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with _lock, open(_store.sidecar(path, manifest_file), 'a') as dst:
+        dst.write(json.dumps(record) + '\n')
+
+def load(path: str) -> dict:
+    # the latest record per file wins, and a truncated last line from a crash is ignored
+    manifest = {}
+    if not os.path.exists(_store.sidecar(path, manifest_file)):
+        return manifest
+    with open(_store.sidecar(path, manifest_file)) as src:
+        for line in src:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            manifest[record['file']] = record
+    return manifest
+
+def verified(path: str, file: str, url: str, manifest: dict) -> bool:
+    record = manifest.get(file)
+    if record is None or record['status'] != 200 or record['url'] != url:
+        return False
+    try:
+        content = _store.read(path, file)
+        return len(content) == record['size'] and sha256(content) == record['sha256']
+    except OSError:
+        return False
@@ -5,23 +5,32 @@
 
 import os
 import re
-from typing import Sequence
+from typing import Sequence, Set
+
+import lxml.html
 
 from scripts._extract import _soup
+from scripts._extract import _store
 
 def _files(regex: str, path: str) -> Sequence[int]:
     return list(sorted({
         int(os.path.splitext(file)[0].split('-')[-1])
-        for file in os.listdir(path)
+        for file in _store.files(path)
         if re.match(regex, file)
     }))
 
+def _player_ids(content: bytes) -> Set[int]:
+    # a plain lxml tree is much cheaper than a BeautifulSoup one
+    return {
+        int(a.get('href').split('=')[-1])
+        for td in lxml.html.fromstring(content).xpath('//td[contains(concat(" ", normalize-space(@class), " "), " name ")]')
+        for a in [td.find('.//a')]
+        if a is not None
+    }
+
 def _players(path: str) -> Sequence[int]:
-    return list(sorted(set.union(*[{
-            int(td.find('a')['href'].split('=')[-1])
-            for td in _soup._tourn_table(eid, path).find_all('td', {'class': 'name'})
-            if td.text
-        }
+    return list(sorted(set.union(*[
+        _player_ids(_store.read(path, f'tourn_table-{eid}.html'))
         for eid in _files(r'tourn_table-\d+\.html', path)
     ])))
 
@@ -0,0 +1,89 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import collections
+import http.server
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+import lxml.html
+
+from scripts._extract import _store
+
+# a local stand-in for https://www.kleier.net/ that serves the .html files written by extract, loose or packed
+routes = {
+    '/tournaments/byplace/index.php': lambda query: 'tournaments.html',
+    '/cgi/tourn_table.php'          : lambda query: f'tourn_table-{int(query["eid"][0])}.html',
+    '/cgi/player.php'               : lambda query: f'player-{int(query["pid"][0])}.html',
+    '/cgi/rat_table.php'            : lambda query: 'rat_table.html'
+}
+
+def _rat_table(content: bytes, query: dict) -> bytes:
+    # keep only the players whose surname lies in [from, till), just like the surname filter of the real site
+    from_, till = query.get('from', ['A'])[0], query.get('till', ['['])[0]
+    if (from_, till) == ('A', '['):
+        return content
+    tree = lxml.html.fromstring(content)
+    for table in tree.xpath('//table[@summary="Stratego Rating"]'):
+        header = [th.text_content() for th in table.xpath('.//tr[1]/th')]
+        column = sum(int(th.get('colspan', 1)) for th in table.xpath('.//tr[1]/th')[:header.index('Surname')])
+        for tr in table.xpath('.//tr[td]'):
+            if not from_ <= tr.findall('td')[column].text_content() < till:
+                tr.getparent().remove(tr)
+    return lxml.html.tostring(tree)
+
+# responses that depend on the query beyond the file name
+filters = {
+    '/cgi/rat_table.php': _rat_table
+}
+
+def _handler(html_path: str, latency: float, error_rate: float, seed: int) -> type:
+    # errors are drawn per (url, attempt), so that they do not depend on the order of concurrent requests
+    attempts = collections.Counter()
+    lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with lock:
+                attempts[self.path] += 1
+                attempt = attempts[self.path]
+            if latency:
+                time.sleep(latency)
+            url = urllib.parse.urlsplit(self.path)
+            if not url.path in routes:
+                return self._send(404, b'')
+            try:
+                file = routes[url.path](urllib.parse.parse_qs(url.query))
+            except (KeyError, ValueError):
+                return self._send(400, b'')
+            if random.Random(f'{seed}:{self.path}:{attempt}').random() < error_rate:
+                return self._send(503, b'')
+            if not _store.exists(html_path, file):
+                return self._send(404, b'')
+            content = _store.read(html_path, file)
+            if url.path in filters:
+                content = filters[url.path](content, urllib.parse.parse_qs(url.query))
+            self._send(200, content)
+
+        def _send(self, status: int, content: bytes) -> None:
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def server(html_path: str, host: str = 'localhost', port: int = 8000, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> http.server.ThreadingHTTPServer:
+    assert os.path.exists(html_path) and 0.0 <= error_rate < 1.0
+    return http.server.ThreadingHTTPServer((host, port), _handler(html_path, latency, error_rate, seed))
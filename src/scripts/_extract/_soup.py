@@ -7,9 +7,11 @@ import os
 
 import bs4, lxml
 
+from scripts._extract import _store
+
 def _do_soup(path: str, file: str) -> bs4.BeautifulSoup:
     assert os.path.exists(path) and file.endswith('.html')
-    return bs4.BeautifulSoup(open(os.path.join(path, file)), 'lxml')
+    return bs4.BeautifulSoup(_store.read(path, file).decode(), 'lxml')
 
 def _player(pid: int, path: str) -> bs4.BeautifulSoup:
     return _do_soup(path, f'player-{pid}.html')
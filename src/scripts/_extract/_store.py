@@ -0,0 +1,185 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import io
+import json
+import os
+import tempfile
+import threading
+import zlib
+from typing import BinaryIO, Sequence
+
+# The .html files are stored either as loose files in a directory, or in a single pack file whose path ends in .pack.
+# A pack file is an append-only sequence of zlib-compressed blobs, with a sidecar .idx file of JSON lines that maps
+# every file name to the offset and length of its latest blob, or to a deletion marker. A crash after a blob but before
+# its index line only leaves unreferenced bytes behind, and a truncated last index line is ignored.
+pack_ext = '.pack'
+index_ext = '.idx'
+
+_lock = threading.Lock()
+_indexes = {}
+
+def is_pack(path: str) -> bool:
+    return path.endswith(pack_ext)
+
+def sidecar(path: str, name: str) -> str:
+    return f'{path}.{name}' if is_pack(path) else os.path.join(path, name)
+
+def _stat(file: str) -> tuple:
+    try:
+        stat = os.stat(file)
+        return stat.st_size, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _load_index(path: str) -> dict:
+    index = {}
+    if not os.path.exists(path + index_ext):
+        return index
+    with open(path + index_ext) as src:
+        for line in src:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('deleted'):
+                index.pop(entry['file'], None)
+            else:
+                index[entry['file']] = entry
+    return index
+
+def _index(path: str) -> dict:
+    # the index is only read back from disk when another process has appended to it
+    with _lock:
+        stat = _stat(path + index_ext)
+        if path not in _indexes or _indexes[path][0] != stat:
+            _indexes[path] = stat, _load_index(path)
+        return _indexes[path][1]
+
+def _write_pack(path: str, file: str, content: bytes) -> None:
+    blob = zlib.compress(content, 9)
+    with _lock:
+        os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+        with open(path, 'ab') as dst:
+            offset = dst.tell()
+            dst.write(blob)
+            dst.flush()
+            os.fsync(dst.fileno())
+        entry = {'file': file, 'offset': offset, 'length': len(blob), 'size': len(content)}
+        with open(path + index_ext, 'a') as dst:
+            dst.write(json.dumps(entry) + '\n')
+        if path in _indexes:
+            _indexes[path][1][file] = entry
+            _indexes[path] = _stat(path + index_ext), _indexes[path][1]
+
+def _write_file(path: str, file: str, content: bytes) -> None:
+    # write-then-rename, so that a crash never leaves a truncated file behind under the target name
+    os.makedirs(path, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path, prefix=f'.{file}.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as dst:
+            dst.write(content)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, os.path.join(path, file))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def write(path: str, file: str, content: bytes) -> None:
+    if is_pack(path):
+        _write_pack(path, file, content)
+    else:
+        _write_file(path, file, content)
+
+def _remove_pack(path: str, file: str) -> None:
+    with _lock:
+        with open(path + index_ext, 'a') as dst:
+            dst.write(json.dumps({'file': file, 'deleted': True}) + '\n')
+        if path in _indexes:
+            _indexes[path][1].pop(file, None)
+            _indexes[path] = _stat(path + index_ext), _indexes[path][1]
+
+def remove(path: str, file: str) -> None:
+    if not exists(path, file):
+        return
+    if is_pack(path):
+        _remove_pack(path, file)
+    else:
+        os.remove(os.path.join(path, file))
+
+def read(path: str, file: str) -> bytes:
+    if not is_pack(path):
+        with open(os.path.join(path, file), 'rb') as src:
+            return src.read()
+    entry = _index(path).get(file)
+    if entry is None:
+        raise FileNotFoundError(f'{file} is not in {path}')
+    with open(path, 'rb') as src:
+        src.seek(entry['offset'])
+        content = zlib.decompress(src.read(entry['length']))
+    assert len(content) == entry['size']
+    return content
+
+class _Inflate(io.RawIOBase):
+    # decompresses a blob in chunks, so that it can be streamed without holding all of its content
+    def __init__(self, src: BinaryIO, length: int):
+        self.src, self.left, self.inflate, self.buffer = src, length, zlib.decompressobj(), b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer:
+            if self.inflate.unconsumed_tail:
+                data = self.inflate.unconsumed_tail
+            elif self.left:
+                data = self.src.read(min(self.left, 1 << 16))
+                self.left -= len(data)
+            else:
+                return 0
+            self.buffer = self.inflate.decompress(data, len(b))
+        n = len(self.buffer)
+        b[:n], self.buffer = self.buffer, b''
+        return n
+
+    def close(self) -> None:
+        self.src.close()
+        super().close()
+
+def stream(path: str, file: str) -> BinaryIO:
+    if not is_pack(path):
+        return open(os.path.join(path, file), 'rb')
+    entry = _index(path).get(file)
+    if entry is None:
+        raise FileNotFoundError(f'{file} is not in {path}')
+    src = open(path, 'rb')
+    src.seek(entry['offset'])
+    return io.BufferedReader(_Inflate(src, entry['length']))
+
+def exists(path: str, file: str) -> bool:
+    if is_pack(path):
+        return file in _index(path)
+    return os.path.exists(os.path.join(path, file))
+
+def files(path: str) -> Sequence[str]:
+    if is_pack(path):
+        return list(_index(path))
+    return [
+        file
+        for file in os.listdir(path)
+        if not file.startswith('.')
+    ]
+
+def copy(src: str, dst: str) -> int:
+    # e.g. to convert a directory of loose files into a pack file, or back
+    names = [
+        file
+        for file in sorted(files(src))
+        if file.endswith('.html')
+    ]
+    for file in names:
+        write(dst, file, read(src, file))
+    return len(names)
@@ -0,0 +1,150 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Tuple
+
+import pandas as pd
+
+from scripts._transform.query import primary_keys
+
+# the tables in an order that respects the foreign keys below
+table_names = [
+    'tournaments',
+    'events',
+    'groups',
+    'names',
+    'standings',
+    'activity',
+    'results',
+    'expected',
+    'dates',
+    'ratings',
+    'history'
+]
+
+# pid2 = 0 for byes, so that results.pid2 cannot reference names.pid
+foreign_keys = {
+    'tournaments': [],
+    'events'     : [(['eid'], 'tournaments', ['eid'])],
+    'groups'     : [(['eid'], 'events', ['eid'])],
+    'names'      : [],
+    'standings'  : [(['eid', 'gid'], 'groups', ['eid', 'gid']), (['pid'], 'names', ['pid'])],
+    'activity'   : [(['pid'], 'names', ['pid']), (['eid'], 'events', ['eid'])],
+    'results'    : [(['eid', 'gid', 'pid1'], 'standings', ['eid', 'gid', 'pid'])],
+    'expected'   : [(['pid1'], 'names', ['pid']), (['pid2'], 'names', ['pid'])],
+    'dates'      : [],
+    'ratings'    : [(['pid'], 'names', ['pid'])],
+    'history'    : [(['eid'], 'events', ['eid']), (['pid'], 'names', ['pid'])]
+}
+
+secondary_indexes = {
+    'tournaments': [],
+    'events'     : [['date']],
+    'groups'     : [],
+    'names'      : [['sur', 'pre']],
+    'standings'  : [['pid']],
+    'activity'   : [['eid']],
+    'results'    : [['pid1'], ['pid2']],
+    'expected'   : [['pid2']],
+    'dates'      : [],
+    'ratings'    : [],
+    'history'    : [['pid']]
+}
+
+sqlite_types = {
+    'b': 'INTEGER',
+    'i': 'INTEGER',
+    'u': 'INTEGER',
+    'f': 'REAL',
+    'M': 'TEXT',
+    'O': 'TEXT'
+}
+
+duckdb_types = {
+    'b': 'BOOLEAN',
+    'i': 'BIGINT',
+    'u': 'BIGINT',
+    'f': 'DOUBLE',
+    'M': 'TIMESTAMP',
+    'O': 'VARCHAR'
+}
+
+def _column_type(s: pd.Series, types: Dict[str, str]) -> str:
+    # nullable extension dtypes, such as Int64, map to the kind of their numpy counterpart
+    kind = getattr(s.dtype, 'numpy_dtype', s.dtype).kind
+    if kind == 'O' and pd.api.types.infer_dtype(s, skipna=True) == 'boolean':
+        kind = 'b'
+    return types.get(kind, types['O'])
+
+def _quote(columns: List[str]) -> str:
+    return ', '.join(f'"{column}"' for column in columns)
+
+def _create_table(name: str, df: pd.DataFrame, types: Dict[str, str]) -> str:
+    columns = [
+        f'"{column}" {_column_type(df[column], types)}'
+        for column in df.columns
+    ]
+    constraints = [f'PRIMARY KEY ({_quote(primary_keys[name])})'] + [
+        f'FOREIGN KEY ({_quote(foreign_key)}) REFERENCES "{table}" ({_quote(key)})'
+        for foreign_key, table, key in foreign_keys[name]
+    ]
+    return f'CREATE TABLE "{name}" ({", ".join(columns + constraints)})'
+
+def _create_indexes(name: str) -> List[str]:
+    return [
+        f'CREATE INDEX "{name}_{"_".join(columns)}" ON "{name}" ({_quote(columns)})'
+        for columns in secondary_indexes[name]
+    ]
+
+def _sqlite_rows(df: pd.DataFrame) -> Iterator[Tuple]:
+    # sqlite3 only binds builtin Python types, with None for missing values
+    return (df
+        .assign(**{
+            column: df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+            for column in df.select_dtypes('datetime').columns
+        })
+        .astype(object)
+        .pipe(lambda x: x.where(x.notnull(), None))
+        .itertuples(index=False, name=None)
+    )
+
+def _to_sqlite(datasets: Dict[str, pd.DataFrame], database: str) -> None:
+    with sqlite3.connect(database) as con:
+        con.execute('PRAGMA foreign_keys = ON')
+        for name in table_names:
+            df = datasets[name]
+            con.execute(_create_table(name, df, sqlite_types))
+            con.executemany(
+                f'INSERT INTO "{name}" VALUES ({", ".join(["?"] * len(df.columns))})',
+                _sqlite_rows(df)
+            )
+            for statement in _create_indexes(name):
+                con.execute(statement)
+    con.close()
+
+def _to_duckdb(datasets: Dict[str, pd.DataFrame], database: str) -> None:
+    import duckdb
+    con = duckdb.connect(database)
+    try:
+        for name in table_names:
+            df = datasets[name]
+            con.execute(_create_table(name, df, duckdb_types))
+            con.register('df', df)
+            con.execute(f'INSERT INTO "{name}" SELECT * FROM df')
+            con.unregister('df')
+            for statement in _create_indexes(name):
+                con.execute(statement)
+    finally:
+        con.close()
+
+def export(pkl_path: str, database: str, format: str) -> None:
+    assert os.path.exists(pkl_path) and not os.path.exists(database)
+    datasets = {
+        name: pd.read_pickle(os.path.join(pkl_path, name + '.pkl'))
+        for name in table_names
+    }
+    {'sqlite': _to_sqlite, 'duckdb': _to_duckdb}[format](datasets, database)
@@ -0,0 +1,135 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import gc
+import os
+import re
+import shutil
+from typing import Callable, List, Sequence
+
+import pandas as pd
+
+from scripts._extract import _scan
+from scripts._transform import _format
+from scripts._transform import _incremental
+from scripts._transform import _normalize
+from scripts._transform import _parse
+from scripts._transform import _profile
+
+# Every batch of tournaments or players is written to its own partition, pkl_path/parts/<dataset>/<first>-<last>.pkl,
+# and all datasets of a batch share the same partition name, so that the normalize joins can be done per partition.
+parts_dir = 'parts'
+
+# the peak memory of parsing and formatting a batch, as a multiple of the memory of its parsed frames, since the
+# parse trees and intermediate frames are alive at the same time: about 11.3 to 12.2 under tracemalloc for batches
+# of 8 tournament tables of the synthetic corpus, so that a batch is sized to stay within the target at its peak.
+# This only bounds the parse and format phase: the consolidated datasets and the indexes still hold all the rows.
+batch_peak_ratio = 12
+
+tourn_table_names = ['events', 'groups', 'activity', 'standings', 'results']
+
+def _dir(pkl_path: str, name: str) -> str:
+    return os.path.join(pkl_path, parts_dir, name)
+
+def _write(pkl_path: str, name: str, df: pd.DataFrame, ids: Sequence[int]) -> None:
+    os.makedirs(_dir(pkl_path, name), exist_ok=True)
+    df.to_pickle(os.path.join(_dir(pkl_path, name), f'{ids[0]}-{ids[-1]}.pkl'))
+
+def parts(pkl_path: str, name: str) -> List[str]:
+    return sorted(
+        os.listdir(_dir(pkl_path, name)),
+        key=lambda file: int(re.match(r'(\d+)-', file).group(1))
+    )
+
+def read(pkl_path: str, name: str, part: str = None) -> pd.DataFrame:
+    if part is not None:
+        return pd.read_pickle(os.path.join(_dir(pkl_path, name), part))
+    return pd.concat([
+        read(pkl_path, name, part)
+        for part in parts(pkl_path, name)
+    ], ignore_index=True, sort=False)
+
+def _nbytes(*dfs: pd.DataFrame) -> int:
+    return sum(
+        int(df.memory_usage(deep=True).sum())
+        for df in dfs
+        if df is not None
+    )
+
+def _batches(ids: Sequence[int], batch_bytes: int, fun: Callable[[Sequence[int]], int], size: int = 8) -> int:
+    # fun processes a batch and returns the memory of its parsed frames, from which the next batch size is estimated
+    i, count = 0, 0
+    while i < len(ids):
+        batch = ids[i:i + size]
+        nbytes = fun(batch)
+        gc.collect()
+        i, count = i + len(batch), count + 1
+        size = max(1, int(batch_bytes / (batch_peak_ratio * max(nbytes, 1) / len(batch))))
+    return count
+
+def tourn_tables(html_path: str, pkl_path: str, batch_bytes: int, profile=_profile.passthrough) -> pd.DataFrame:
+    # the formatted tournament datasets per batch of eids, and the distinct player names in their standings
+    players = []
+    def batch(eid_seq: Sequence[int]) -> int:
+        events, groups, activity, standings, results = profile(_parse._tourn_tables, html_path, eid_seq)
+        nbytes = _nbytes(events, groups, activity, standings, results)
+        datasets = [
+            profile(_format._events, events),
+            profile(_format._groups, groups),
+            profile(_format._activity, activity),
+            profile(_format._standings, standings),
+            profile(_format._results, results)
+        ]
+        for name, df in zip(tourn_table_names, datasets):
+            _write(pkl_path, name, df, eid_seq)
+        players.append(datasets[3].loc[:, ['pre', 'sur', 'nat']].drop_duplicates())
+        return nbytes
+    _batches(_scan._files(r'tourn_table-\d+\.html', html_path), batch_bytes, batch)
+    return pd.concat(players, ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+def players(html_path: str, pkl_path: str, batch_bytes: int, profile=_profile.passthrough) -> pd.DataFrame:
+    # the formatted expected results per batch of pids, and all formatted names, which are small
+    names = []
+    def batch(pid_seq: Sequence[int]) -> int:
+        name, expected = profile(_parse._players, html_path, pid_seq)
+        nbytes = _nbytes(name, expected)
+        _write(pkl_path, 'expected', profile(_format._expected, expected), pid_seq)
+        names.append(profile(_format._names, name))
+        return nbytes
+    _batches(_scan._files(r'player-\d+\.html', html_path), batch_bytes, batch)
+    return pd.concat(names, ignore_index=True)
+
+def normalize_tourn_tables(pkl_path: str, names: pd.DataFrame, profile=_profile.passthrough) -> None:
+    # all datasets of a batch are in partitions with the same name, so the standings are joined per partition
+    for part in parts(pkl_path, 'events'):
+        events, groups, activity, standings, results = (
+            read(pkl_path, name, part)
+            for name in tourn_table_names
+        )
+        events    = profile(_normalize._events, events)
+        groups    = profile(_normalize._groups, groups)
+        activity  = profile(_normalize._activity, activity, names)
+        standings = profile(_normalize._standings, standings, names)
+        results   = profile(_normalize._results, results, standings)
+        for name, df in zip(tourn_table_names, [events, groups, activity, standings, results]):
+            df.to_pickle(os.path.join(_dir(pkl_path, name), part))
+
+def normalize_expected(pkl_path: str, events: pd.DataFrame, names: pd.DataFrame, ratings: pd.DataFrame, profile=_profile.passthrough) -> None:
+    # only the checks that involve the rows of a single partition, as in an incremental transform
+    for part in parts(pkl_path, 'expected'):
+        expected = read(pkl_path, 'expected', part)
+        profile(_incremental._expected, expected, events, names, ratings).to_pickle(os.path.join(_dir(pkl_path, 'expected'), part))
+
+def consolidate(pkl_path: str, name: str, order: List[str] = None) -> pd.DataFrame:
+    # partitions are in increasing order of their ids, so only datasets with a different key order need a sort
+    df = read(pkl_path, name)
+    if order is not None:
+        df = df.sort_values(order, kind='stable').reset_index(drop=True)
+    assert _normalize._has_consistent_index(df)
+    df.to_pickle(os.path.join(pkl_path, name + '.pkl'))
+    return df
+
+def clear(pkl_path: str) -> None:
+    shutil.rmtree(os.path.join(pkl_path, parts_dir), ignore_errors=True)
@@ -0,0 +1,92 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import concurrent.futures
+import graphlib
+import time
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from scripts._transform import _format
+from scripts._transform import _normalize
+from scripts._transform import _profile
+
+# A graph maps every task to its function and arguments, where ':name' is the output of another task,
+# and a plain name is one of the input datasets.
+normalize_graph = {
+    'tournaments': (_normalize._tournaments, ['tournaments'                                              ]),
+    'events'     : (_normalize._events     , ['events'                                                   ]),
+    'groups'     : (_normalize._groups     , ['groups'                                                   ]),
+    'names'      : (_normalize._names      , ['names', 'standings'                                       ]),
+    'dates'      : (_normalize._dates      , ['dates'                                                    ]),
+    'ratings'    : (_normalize._ratings    , ['ratings', ':names'                                        ]),
+    'history'    : (_normalize._history    , ['history', ':events', ':names'                             ]),
+    'activity'   : (_normalize._activity   , ['activity', ':names'                                       ]),
+    'standings'  : (_normalize._standings  , ['standings', ':names'                                      ]),
+    'results'    : (_normalize._results    , ['results', ':standings'                                    ]),
+    'expected'   : (_normalize._expected   , ['expected', ':events', ':names', ':dates', ':ratings', ':results'])
+}
+
+# every dataset is formatted on its own
+format_graph = {
+    name: (getattr(_format, '_' + name), [name])
+    for name in normalize_graph
+}
+
+def _dependencies(graph: Dict[str, tuple]) -> Dict[str, set]:
+    return {
+        name: {arg[1:] for arg in args if arg.startswith(':')}
+        for name, (_, args) in graph.items()
+    }
+
+def _timed(profile: Callable, fun: Callable, *args) -> tuple:
+    start = time.perf_counter()
+    result = profile(fun, *args)
+    return result, time.perf_counter() - start
+
+def _critical_path(graph: Dict[str, tuple], seconds: Dict[str, float]) -> List[str]:
+    # the longest chain of dependent tasks, weighted by their run times
+    dependencies = _dependencies(graph)
+    finish, previous = {}, {}
+    for name in graphlib.TopologicalSorter(dependencies).static_order():
+        before = max(dependencies[name], key=lambda dep: finish[dep], default=None)
+        finish[name] = seconds[name] + (finish[before] if before else 0.0)
+        previous[name] = before
+    path = [max(finish, key=finish.get)]
+    while previous[path[-1]]:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+def run(graph: Dict[str, tuple], inputs: Dict[str, pd.DataFrame], jobs: int = 4, executor: str = 'thread', profile=_profile.passthrough) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    # every task is submitted as soon as all of its dependencies are done
+    Executor = concurrent.futures.ThreadPoolExecutor if executor == 'thread' else concurrent.futures.ProcessPoolExecutor
+    sorter = graphlib.TopologicalSorter(_dependencies(graph))
+    sorter.prepare()
+    outputs, records, running = {}, [], {}
+    origin = time.perf_counter()
+    with Executor(max_workers=jobs) as pool:
+        while sorter.is_active():
+            for name in sorter.get_ready():
+                fun, args = graph[name]
+                values = [outputs[arg[1:]] if arg.startswith(':') else inputs[arg] for arg in args]
+                running[pool.submit(_timed, profile, fun, *values)] = name, time.perf_counter() - origin
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name, submitted = running.pop(future)
+                outputs[name], seconds = future.result()
+                records.append({'task': name, 'submitted': submitted, 'done': time.perf_counter() - origin, 'seconds': seconds})
+                sorter.done(name)
+    report = pd.DataFrame(records)
+    path = _critical_path(graph, dict(zip(report.task, report.seconds)))
+    report = report.assign(critical = lambda x: x.task.isin(path))
+    return outputs, report
+
+def summary(report: pd.DataFrame, graph: Dict[str, tuple]) -> str:
+    path = _critical_path(graph, dict(zip(report.task, report.seconds)))
+    return (
+        f'wall {report.done.max():.3f}s, sum {report.seconds.sum():.3f}s, '
+        f'critical path {report.query("critical").seconds.sum():.3f}s: ' + ' -> '.join(path)
+    )
@@ -0,0 +1,126 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scripts._extract import _store
+from scripts._transform import _format
+from scripts._transform import _normalize
+from scripts._transform import _parse
+from scripts._transform import _profile
+
+# the checksums of the .html files that the normalized tables were last built from
+sources_file = 'sources.json'
+
+def sources(html_path: str) -> Dict[str, str]:
+    return {
+        file: hashlib.sha256(_store.read(html_path, file)).hexdigest()
+        for file in sorted(_store.files(html_path))
+        if file.endswith('.html')
+    }
+
+def load(pkl_path: str) -> Dict[str, str]:
+    if not os.path.exists(os.path.join(pkl_path, sources_file)):
+        return None
+    with open(os.path.join(pkl_path, sources_file)) as src:
+        return json.load(src)
+
+def save(pkl_path: str, state: Dict[str, str]) -> None:
+    with open(os.path.join(pkl_path, sources_file), 'w') as dst:
+        json.dump(state, dst, indent=0)
+
+def changes(old: Dict[str, str], new: Dict[str, str]) -> Tuple[List[int], List[int], bool]:
+    # the tournaments and players whose pages were added or changed, and whether the rating table changed,
+    # where only the rating table pages can be removed, when extract switched between a single page and shards
+    removed = set(old) - set(new)
+    assert all(file.startswith('rat_table') for file in removed), 'removed pages require a full transform'
+    changed = [
+        file
+        for file, sha256 in new.items()
+        if old.get(file) != sha256
+    ]
+    def ids(regex: str) -> List[int]:
+        return sorted(
+            int(match.group(1))
+            for match in map(re.compile(regex).match, changed)
+            if match
+        )
+    eid_seq = ids(r'tourn_table-(\d+)\.html$')
+    pid_seq = ids(r'player-(\d+)\.html$')
+    rat_table = any(file.startswith('rat_table') for file in changed + sorted(removed))
+    return eid_seq, pid_seq, rat_table
+
+def _splice(old: pd.DataFrame, new: pd.DataFrame, by: str, touched: Sequence[int], key: List[str], order: List[str]) -> pd.DataFrame:
+    # the rows of the touched ids are replaced, so the key can only collide within the new rows
+    assert new[by].isin(touched).all()
+    assert _normalize._is_key(new, key)
+    df = (pd
+        .concat([old[~old[by].isin(touched)], new], ignore_index=True, sort=False)
+        .sort_values(order, kind='stable')
+        .reset_index(drop=True)
+    )
+    assert _normalize._has_consistent_index(df)
+    return df
+
+def _expected(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame, ratings: pd.DataFrame) -> pd.DataFrame:
+    # the checks of _normalize._expected that only involve the rows of the changed player pages
+    df = _normalize._expected_rows(expected, events, names, ratings)
+    assert _normalize._has_consistent_index(df)
+    assert _normalize._is_functional(df, ['pid1', 'pid2'], 'We')
+    assert (df.R1.isnull() | df.R2.isnull()).equals(df.We.isnull())
+    assert np.isclose(df.dW, df.W - df.We, equal_nan=True).all()
+    return _normalize._expected_pairs(df)
+
+def update(html_path: str, tables: Dict[str, pd.DataFrame], eid_seq: Sequence[int], pid_seq: Sequence[int], rat_table: bool, profile=_profile.passthrough) -> Dict[str, pd.DataFrame]:
+    # tables are the normalized datasets, and only the rows of the changed tournaments and players are rebuilt
+    tables = dict(tables)
+    tables['tournaments'] = profile(_normalize._tournaments, profile(_format._tournaments, profile(_parse._tournaments, html_path)))
+    if eid_seq:
+        events, groups, activity, standings, results = profile(_parse._tourn_tables, html_path, eid_seq)
+        events    = profile(_normalize._events, profile(_format._events, events))
+        groups    = profile(_normalize._groups, profile(_format._groups, groups))
+        activity  = profile(_format._activity, activity)
+        standings = profile(_format._standings, standings)
+        results   = profile(_format._results, results)
+        tables['events'] = _splice(tables['events'], events, 'eid', eid_seq, ['eid'], ['eid'])
+        assert _normalize._is_key(tables['events'], ['date', 'place'])
+        assert tables['events'].date.is_monotonic_increasing
+        tables['groups'] = _splice(tables['groups'], groups, 'eid', eid_seq, ['eid', 'gid'], ['eid', 'gid'])
+    new_pid_seq = sorted(set(pid_seq) - set(tables['names'].pid))
+    if pid_seq:
+        names, expected = profile(_parse._players, html_path, pid_seq)
+        names    = profile(_format._names, names)
+        expected = profile(_format._expected, expected)
+    if new_pid_seq:
+        # the names of new players are split with the help of the standings of the new tournaments
+        assert eid_seq, 'new players require new tournaments'
+        new_names = profile(_normalize._names, names.query('pid in @new_pid_seq').reset_index(drop=True), standings)
+        tables['names'] = _splice(tables['names'], new_names, 'pid', new_pid_seq, ['pid'], ['pid'])
+        assert _normalize._is_key(tables['names'], ['pre', 'sur'])
+        assert tables['names'].pid.equals(pd.Series(np.arange(1, len(tables['names'].index) + 1)))
+    if eid_seq:
+        activity  = profile(_normalize._activity, activity, tables['names'])
+        standings = profile(_normalize._standings, standings, tables['names'])
+        results   = profile(_normalize._results, results, standings)
+        tables['activity']  = _splice(tables['activity'], activity, 'eid', eid_seq, ['pid', 'eid'], ['pid', 'eid'])
+        tables['standings'] = _splice(tables['standings'], standings, 'eid', eid_seq, ['eid', 'gid', 'pid'], ['eid'])
+        tables['results']   = _splice(tables['results'], results, 'eid', eid_seq, ['eid', 'gid', 'round', 'pid1', 'pid2'], ['eid'])
+    if rat_table:
+        # the rating table is one global page, so its datasets are always rebuilt as a whole
+        dates, ratings, history = profile(_parse._rat_table, html_path)
+        tables['dates']   = profile(_normalize._dates, profile(_format._dates, dates))
+        tables['ratings'] = profile(_normalize._ratings, profile(_format._ratings, ratings), tables['names'])
+        tables['history'] = profile(_normalize._history, profile(_format._history, history), tables['events'], tables['names'])
+    if pid_seq:
+        expected = profile(_expected, expected, tables['events'], tables['names'], tables['ratings'])
+        tables['expected'] = _splice(tables['expected'], expected.query('pid1 in @pid_seq'), 'pid1', pid_seq, ['pid1', 'pid2'], ['pid1', 'pid2'])
+    return tables
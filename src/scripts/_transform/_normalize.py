@@ -3,7 +3,6 @@
 #    (See accompanying file LICENSE_1_0.txt or copy at
 #          http://www.boost.org/LICENSE_1_0.txt)
 
-import re
 from typing import List
 
 import numpy as np
@@ -12,6 +11,10 @@ import pandas as pd
 def _is_key(df: pd.DataFrame, key: List[str]) -> bool:
     return not df.duplicated(subset=key).any()
 
+def _is_functional(df: pd.DataFrame, key: List[str], attribute: str) -> bool:
+    # every key has a single attribute value, where a missing value counts as a value
+    return not df.loc[:, key + [attribute]].drop_duplicates().duplicated(subset=key).any()
+
 def _has_consistent_index(df: pd.DataFrame) -> bool:
     return (
         df.index.is_monotonic_increasing and
@@ -260,7 +263,7 @@ def _results(results: pd.DataFrame, standings: pd.DataFrame) -> pd.DataFrame:
     assert _has_consistent_index(df)
     return df
 
-def _expected(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame, dates: pd.DataFrame, ratings: pd.DataFrame, results: pd.DataFrame) -> pd.DataFrame:
+def _expected_rows(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame, ratings: pd.DataFrame) -> pd.DataFrame:
     old_key = ['date', 'place', 'pid1', 'pre2', 'sur2']
     key = ['eid', 'pid1', 'pid2']
     attributes = [
@@ -290,51 +293,34 @@ def _expected(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame,
         )
         .loc[:, key + ['pre2', 'sur2', 'date', 'R1'] + attributes]
     )
+    columns = key + ['date', 'R1'] + attributes
+    # the games against anonymous opponents are also seen from the side of the opponent
     anonymous = (named
         .query('pre2.isnull() | sur2.isnull()')
-        .loc[:, key + ['date', 'R1'] + attributes]
-        .rename(columns=lambda x: re.sub(r'(.+)1', r'\g<1>0', x))
-        .rename(columns=lambda x: re.sub(r'(.+)2', r'\g<1>1', x))
-        .rename(columns=lambda x: re.sub(r'(.+)0', r'\g<1>2', x))
+        .rename(columns={'pid1': 'pid2', 'pid2': 'pid1', 'R1': 'R2', 'R2': 'R1'})
         .assign(
             W  = lambda x: 1.0 - x.W,
             We = lambda x: 1.0 - x.We,
             dW = lambda x: -x.dW
         )
-        .loc[:, key + ['date', 'R1'] + attributes]
     )
-    df = (named
-        .drop(columns=['pre2', 'sur2'])
-        .append(anonymous)
+    return (pd
+        .concat([named.loc[:, columns], anonymous.loc[:, columns]], ignore_index=True)
         .sort_values(
             by=['pid1', 'eid', 'R2'],
             ascending=[True, False, False]
         )
         .reset_index(drop=True)
     )
-    # 1NF
-    assert _has_consistent_index(df)
-    # 2NF
-    assert np.isclose(df.loc[:, ['date', 'significance']].drop_duplicates().significance.sort_values(), dates.significance).all()
-    assert df.loc[:, ['date', 'significance']].drop_duplicates().drop(columns='significance').equals(df.loc[:, ['date'        ]].drop_duplicates())
-    assert df.loc[:, ['pid1', 'R1'          ]].drop_duplicates().drop(columns='R1'          ).equals(df.loc[:, ['pid1'        ]].drop_duplicates())
-    assert df.loc[:, ['pid2', 'R2'          ]].drop_duplicates().drop(columns='R2'          ).equals(df.loc[:, ['pid2'        ]].drop_duplicates())
-    assert df.loc[:, ['pid1', 'pid2', 'We'  ]].drop_duplicates().drop(columns='We'          ).equals(df.loc[:, ['pid1', 'pid2']].drop_duplicates())
-    # 3NF
-    df0 = (results
-        .query('pid2 != 0')
-        .loc[:,      ['eid', 'pid1', 'pid2', 'W', 'unplayed']]
-        .sort_values(['eid', 'pid1', 'pid2', 'W', 'unplayed'])
-        .reset_index(drop=True)
-    )
-    df1 = (df
-        .loc[:,      ['eid', 'pid1', 'pid2', 'W', 'unplayed']]
-        .sort_values(['eid', 'pid1', 'pid2', 'W', 'unplayed'])
-        .reset_index(drop=True)
-    )
-    assert ((df0.unplayed == df1.unplayed) | df1.unplayed.isnull()).all() and df0.W.equals(df1.W)
-    assert (df.R1.isnull() | df.R2.isnull()).equals(df.We.isnull())
-    assert np.isclose(df.dW, df.W - df.We, equal_nan=True).all()
+
+def _lexsort(df: pd.DataFrame, by: List[str]) -> np.ndarray:
+    # the positions of a stable sort with missing values last, as in sort_values, without building the sorted frame
+    return np.lexsort([
+        df[column].to_numpy(dtype=float, na_value=np.nan)
+        for column in reversed(by)
+    ])
+
+def _expected_pairs(df: pd.DataFrame) -> pd.DataFrame:
     key = ['pid1', 'pid2']
     attributes = ['We']
     df = (df
@@ -347,3 +333,26 @@ def _expected(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame,
     assert _is_key(df, key)
     assert df.equals(df.sort_values(key))
     return df
+
+def _expected(expected: pd.DataFrame, events: pd.DataFrame, names: pd.DataFrame, dates: pd.DataFrame, ratings: pd.DataFrame, results: pd.DataFrame) -> pd.DataFrame:
+    df = _expected_rows(expected, events, names, ratings)
+    # 1NF
+    assert _has_consistent_index(df)
+    # 2NF
+    significance = df.loc[:, ['date', 'significance']].drop_duplicates()
+    assert not significance.date.duplicated().any()
+    assert np.isclose(significance.significance.sort_values(), dates.significance).all()
+    assert _is_functional(df, ['pid1'], 'R1')
+    assert _is_functional(df, ['pid2'], 'R2')
+    assert _is_functional(df, ['pid1', 'pid2'], 'We')
+    # 3NF
+    games = results.query('pid2 != 0')
+    order = ['eid', 'pid1', 'pid2', 'W', 'unplayed']
+    i0, i1 = _lexsort(games, order), _lexsort(df, order)
+    assert len(i0) == len(i1)
+    unplayed0, unplayed1 = games.unplayed.to_numpy()[i0], df.unplayed.to_numpy()[i1]
+    assert ((unplayed0 == unplayed1) | pd.isnull(unplayed1)).all()
+    assert np.array_equal(games.W.to_numpy(dtype=float)[i0], df.W.to_numpy(dtype=float)[i1], equal_nan=True)
+    assert (df.R1.isnull() | df.R2.isnull()).equals(df.We.isnull())
+    assert np.isclose(df.dW, df.W - df.We, equal_nan=True).all()
+    return _expected_pairs(df)
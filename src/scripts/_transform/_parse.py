@@ -3,15 +3,18 @@
 #    (See accompanying file LICENSE_1_0.txt or copy at
 #          http://www.boost.org/LICENSE_1_0.txt)
 
+import collections
 import re
-from typing import Sequence, Tuple
+from typing import Iterator, List, Sequence, Tuple
 
 import bs4
+import lxml.etree
 import numpy as np
 import pandas as pd
 
 from scripts._extract import _scan
 from scripts._extract import _soup
+from scripts._extract import _store
 
 # helper functions for _player
 
@@ -87,6 +90,60 @@ def _history(long_rat_table: pd.DataFrame) -> pd.DataFrame:
         )
     )
 
+def _text(cell: lxml.etree._Element) -> str:
+    # the same whitespace handling as pd.read_html
+    return re.sub(r'[\r\n]+|\s{2,}', ' ', ''.join(cell.itertext()).strip())
+
+def _expand(tr: lxml.etree._Element, spans: dict) -> List[str]:
+    # the cell texts of a row, with colspans repeated, and with rowspans from previous rows inserted at their column
+    row = []
+    cells = [cell for cell in tr if cell.tag in ('td', 'th')]
+    i = 0
+    while i < len(cells) or len(row) in spans:
+        if len(row) in spans:
+            text, rowspan = spans.pop(len(row))
+            if rowspan > 1:
+                spans[len(row)] = text, rowspan - 1
+            row.append(text)
+            continue
+        cell = cells[i]
+        i += 1
+        text = _text(cell)
+        rowspan = int(cell.get('rowspan', 1))
+        for _ in range(int(cell.get('colspan', 1))):
+            if rowspan > 1:
+                spans[len(row)] = text, rowspan - 1
+            row.append(text)
+    return row
+
+def _numeric(values: Sequence[str]) -> pd.Series:
+    # columns that are entirely numeric are converted, just like pd.read_html does
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='ignore')
+
+def _iter_rat_table(src) -> Iterator[Tuple[List[tuple], List[str]]]:
+    # the columns and every expanded body row, one at a time, so that only the current row is kept in the tree
+    header, columns, spans = [], None, {}
+    for _, tr in lxml.etree.iterparse(src, events=('end',), tag='tr', html=True):
+        table = next(tr.iterancestors('table'), None)
+        if table is not None and table.get('summary') == 'Stratego Rating':
+            row = _expand(tr, spans)
+            if columns is None and all(cell.tag == 'th' for cell in tr if cell.tag in ('td', 'th')):
+                header.append(row)
+            else:
+                columns = columns or list(zip(*header))
+                yield columns, row
+        tr.clear()
+        while tr.getprevious() is not None:
+            del tr.getparent()[0]
+
+def _cell(text: str):
+    # an integer if the text is one, so that a rating takes less memory than its text and can be restored exactly
+    return int(text) if re.fullmatch(r'-?[1-9]\d*|0', text) else text
+
+def _values(cells: list) -> pd.Series:
+    # the cells of a rating column as _numeric would convert their texts
+    return _numeric(cells if all(isinstance(cell, int) for cell in cells) else [str(cell) for cell in cells])
+
 # helper functions for _tourn_table
 
 def _results_from(s: str) -> Tuple[str]:
@@ -214,16 +271,16 @@ def _player(pid: int, path: str) -> Tuple[pd.DataFrame]:
     expected = _expected(pid, table) if table else None
     return name, expected
 
-def _players(path: str) -> Tuple[pd.DataFrame]:
+def _players(path: str, pid_seq: Sequence[int] = None) -> Tuple[pd.DataFrame]:
     return tuple(
         pd.concat(list(t), ignore_index=True, sort=False)
         for t in zip(*[
             _player(pid, path)
-            for pid in _scan._files(r'player-\d+\.html', path)
+            for pid in (_scan._files(r'player-\d+\.html', path) if pid_seq is None else pid_seq)
         ])
     )
 
-def _rat_table(path: str) -> Tuple[pd.DataFrame]:
+def _rat_table_soup(path: str) -> Tuple[pd.DataFrame]:
     table = _soup._rat_table(path).find('table', {'summary': 'Stratego Rating'})
     long_rat_table = _long_rat_table(table)
     dates = _dates(long_rat_table)
@@ -231,6 +288,95 @@ def _rat_table(path: str) -> Tuple[pd.DataFrame]:
     history = _history(long_rat_table)
     return dates, ratings, history
 
+def _rat_table_files(path: str) -> List[str]:
+    # either the shards fetched by surname range or a single page, since extract removes the other layout
+    shards = sorted(
+        file
+        for file in _store.files(path)
+        if re.match(r'rat_table-.+\.html$', file)
+    )
+    assert not (shards and _store.exists(path, 'rat_table.html')), f'{path} contains both rat_table.html and rat_table-*.html shards'
+    return shards or ['rat_table.html']
+
+def _merge_order(columns: List[tuple], ident: List[tuple], R: list) -> np.ndarray:
+    # the rows of overlapping shards are deduplicated, and put back in the order of a single page: by descending
+    # current rating, and then by the rank on their own page and by shard, since the order of equal ratings
+    # across shards cannot be recovered when a shard only ranks its own players
+    seen, keep = set(), []
+    for i, row in enumerate(ident):
+        if row not in seen:
+            seen.add(row)
+            keep.append(i)
+    keep = np.array(keep, dtype=int)
+    int_rank = next(k for k, column in enumerate(columns) if column[-1] == 'Int.')
+    R, rank = (
+        pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+        for values in ([R[i] for i in keep], [ident[i][int_rank] for i in keep])
+    )
+    return keep[np.lexsort((np.nan_to_num(rank, nan=np.inf), np.nan_to_num(-R, nan=np.inf)))]
+
+def _rerank(columns: List[tuple], ident: List[tuple]) -> List[tuple]:
+    # the international and national ranks of the merged rows, in their order, since a page that is filtered by
+    # surname need not rank its players among all players. Players without a rank on their page stay unranked
+    int_rank = next(k for k, column in enumerate(columns) if column[-1] == 'Int.')
+    nat_rank = next(k for k, column in enumerate(columns) if column[-1] == 'Nat.')
+    ranked, nat_ranked, reranked = 0, collections.Counter(), []
+    for row in ident:
+        row = list(row)
+        if row[int_rank][:1].isdigit():
+            nat = row[nat_rank].split('/')[-1]
+            ranked, nat_ranked[nat] = ranked + 1, nat_ranked[nat] + 1
+            row[int_rank], row[nat_rank] = str(ranked), f'{nat_ranked[nat]}/{nat}'
+        reranked.append(tuple(row))
+    return reranked
+
+def _rat_table(path: str) -> Tuple[pd.DataFrame]:
+    # the same output as _rat_table_soup, where every row is emitted into the long form as soon as it is parsed,
+    # so that only the output so far is kept: the identifying cells of every player, for the current ratings,
+    # and one list of ratings per date, for the history
+    files = _rat_table_files(path)
+    columns, ident, ratings = None, [], None
+    for file in files:
+        with _store.stream(path, file) as src:
+            for shard_columns, row in _iter_rat_table(src):
+                if columns is None:
+                    columns = shard_columns
+                    rating = [j for j, column in enumerate(columns) if column[0] == 'Rating']
+                    keys = [j for j, column in enumerate(columns) if column[0] != 'Rating']
+                    ratings = [[] for _ in rating]
+                assert shard_columns == columns
+                ident.append(tuple(row[j] for j in keys))
+                for cells, j in zip(ratings, rating):
+                    cells.append(_cell(row[j]))
+    assert columns is not None
+    key_columns = [columns[j] for j in keys]
+    if len(files) > 1:
+        order = _merge_order(key_columns, ident, ratings[0])
+        ident = _rerank(key_columns, [ident[i] for i in order])
+        ratings = [[cells[i] for i in order] for cells in ratings]
+    variables = pd.MultiIndex.from_tuples([tuple([f'variable_{i}'] * 4) for i in range(4)])
+    dates = (pd
+        .DataFrame([columns[j] for j in rating], columns=variables, dtype=object)
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    key_values = list(zip(*ident)) if ident else [()] * len(keys)
+    ratings_now = (pd
+        .DataFrame({column: _numeric(list(values)) for column, values in zip(key_columns, key_values)})
+        .assign(**{'Rating': _values(ratings[0]).to_numpy(dtype=object)})
+        .pipe(lambda df: df.set_axis(pd.MultiIndex.from_tuples(df.columns.tolist()[:-1] + [('Rating',) * 4]), axis='columns'))
+    )
+    names = [k for k, column in enumerate(key_columns) if column[0] in ('Surname', 'Prename')]
+    history = pd.DataFrame(
+        {
+            **{key_columns[k]: np.tile(np.array(key_values[k], dtype=object), len(rating)) for k in names},
+            **{variables[i]: np.repeat([columns[j][i] for j in rating], len(ident)) for i in range(4)},
+            ('Rating',) * 4: np.concatenate([_values(cells).to_numpy(dtype=object) for cells in ratings]) if ident else np.empty(0, dtype=object)
+        },
+        dtype=object
+    )
+    return dates, ratings_now, history
+
 def _tourn_table(eid: int, path: str) -> Tuple[pd.DataFrame]:
     soup = _soup._tourn_table(eid, path)
     cross_table_seq = soup.find_all('table', {'summary': 'Stratego Tournament Cross-Table'})
@@ -259,12 +405,12 @@ def _tourn_table(eid: int, path: str) -> Tuple[pd.DataFrame]:
     )
     return event, groups, activity, standings, results
 
-def _tourn_tables(path: str) -> Tuple[pd.DataFrame]:
+def _tourn_tables(path: str, eid_seq: Sequence[int] = None) -> Tuple[pd.DataFrame]:
     return tuple(
         pd.concat(list(t), ignore_index=True, sort=False)
         for t in zip(*[
             _tourn_table(eid, path)
-            for eid in _scan._files(r'tourn_table-\d+\.html', path)
+            for eid in (_scan._files(r'tourn_table-\d+\.html', path) if eid_seq is None else eid_seq)
         ])
     )
 
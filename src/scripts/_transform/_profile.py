@@ -0,0 +1,85 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import cProfile
+import collections
+import gc
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+import pandas as pd
+
+def _rows(obj) -> int:
+    if isinstance(obj, pd.DataFrame):
+        return len(obj.index)
+    if isinstance(obj, tuple):
+        return sum(_rows(x) for x in obj)
+    return 0
+
+def _name(fun: Callable) -> str:
+    return f'{fun.__module__.split(".")[-1]}.{fun.__name__}'
+
+def passthrough(fun: Callable, *args):
+    return fun(*args)
+
+class Profiler:
+    # every profiled function is called once: untraced, unless a cProfile dump is asked for, in which case the peak
+    # of the traced Python allocations is measured in the same call and its wall time includes the tracing overhead.
+    # The calls are serialized, since tracing is global to the process and concurrent tasks would be traced as well
+    def __init__(self, cprofile_dir: str = None):
+        self.cprofile_dir = cprofile_dir
+        self.records = []
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, fun: Callable, *args):
+        name = _name(fun)
+        profiler, peak = None, None
+        with self.lock:
+            self.calls[name] += 1
+            count = self.calls[name]
+            gc.collect()
+            if self.cprofile_dir:
+                profiler = cProfile.Profile()
+                tracemalloc.start()
+                profiler.enable()
+            start = time.perf_counter()
+            result = fun(*args)
+            seconds = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+        if profiler:
+            # a function is called once per batch of a chunked transform, so every call gets its own dump
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.cprofile_dir, f'{name}-{count}.prof'))
+        self.records.append({
+            'function'  : name,
+            'seconds'   : seconds,
+            'rows_in'   : _rows(args),
+            'rows_out'  : _rows(result),
+            'peak_bytes': peak,
+            # the high-water mark of the resident set size of the whole process so far, in kilobytes on Linux,
+            # which is not a figure of the profiled function itself
+            'process_max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        })
+        return result
+
+    def table(self) -> pd.DataFrame:
+        return (pd
+            .DataFrame(self.records, columns=['function', 'seconds', 'rows_in', 'rows_out', 'peak_bytes', 'process_max_rss_kb'])
+            .astype(dtype={'peak_bytes': float})
+        )
+
+    def to_json(self, file: str) -> None:
+        os.makedirs(os.path.dirname(file) or os.curdir, exist_ok=True)
+        with open(file, 'w') as dst:
+            json.dump(self.records, dst, indent=2)
@@ -0,0 +1,90 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import concurrent.futures
+import itertools
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scripts._transform import replay
+
+# The played games are copied once into shared memory, and every worker process attaches to them by name,
+# so that a sweep over many configurations does not pickle the games to the workers for every configuration.
+columns = ['eid', 'day', 'pid1', 'pid2', 'W']
+
+_blocks = []
+_arrays = {}
+
+def grid(system: str, **values: list) -> List[Tuple[str, dict]]:
+    # all combinations of the parameter values of a rating system
+    return [
+        (system, dict(zip(values, combination)))
+        for combination in itertools.product(*values.values())
+    ]
+
+def _share(games: pd.DataFrame) -> Tuple[list, Dict[str, tuple]]:
+    blocks, specs = [], {}
+    for column in columns:
+        array = np.ascontiguousarray(games[column].to_numpy())
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[column] = block.name, array.shape, array.dtype.str
+    return blocks, specs
+
+def _attach(specs: Dict[str, tuple]) -> None:
+    # the read-only views of a worker process, whose blocks are kept open for the lifetime of the worker
+    for column, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _blocks.append(block)
+        _arrays[column] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        _arrays[column].flags.writeable = False
+
+def _detach() -> None:
+    _arrays.clear()
+    for block in _blocks:
+        block.close()
+    _blocks.clear()
+
+def _score(system: str, params: dict, min_eid: int) -> dict:
+    # every game is predicted by the ratings before its event, and the games before min_eid are only a warmup
+    start = time.perf_counter()
+    We, _ = replay.run(system, params, *(_arrays[column] for column in columns), history=False)
+    scored = _arrays['eid'] >= min_eid
+    return {
+        'system': system,
+        **params,
+        **replay.metrics(_arrays['W'][scored], We[scored]),
+        'seconds': time.perf_counter() - start
+    }
+
+def backtest(results: pd.DataFrame, events: pd.DataFrame, configs: List[Tuple[str, dict]], jobs: int = 4, warmup: int = 0) -> pd.DataFrame:
+    # the walk-forward log loss, Brier score and accuracy of every configuration, after a warmup of events
+    games = replay.games(results, events).assign(W = lambda x: x.W.astype(float))
+    eids = np.unique(games.eid.to_numpy())
+    assert 0 <= warmup < len(eids), f'the warmup of {warmup} events leaves none of the {len(eids)} events with played games to score'
+    min_eid = eids[warmup]
+    blocks, specs = _share(games)
+    del games
+    try:
+        args = [[system for system, _ in configs], [params for _, params in configs], [min_eid] * len(configs)]
+        if jobs == 1:
+            _attach(specs)
+            try:
+                records = list(map(_score, *args))
+            finally:
+                _detach()
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_attach, initargs=(specs,)) as pool:
+                records = list(pool.map(_score, *args))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return pd.DataFrame(records)
@@ -6,11 +6,15 @@
 import numpy as np
 import pandas as pd
 
-def date_significance(date: pd.Series, max_date: 'datetime64[ns]') -> pd.Series:
-    # https://www.kleier.net/txt/rating_23.html#SEC23
-    decay = 2.5731
-    tropical_year = 365.246
-    return np.round(np.exp(-((max_date - date).dt.days / (decay * tropical_year))**2), 6)
+# https://www.kleier.net/txt/rating_23.html#SEC23
+decay = 2.5731
+tropical_year = 365.246
+
+def days_significance(days, decay: float = decay):
+    return np.exp(-(days / (decay * tropical_year))**2)
+
+def date_significance(date: pd.Series, max_date: 'datetime64[ns]', decay: float = decay) -> pd.Series:
+    return np.round(days_significance((max_date - date).dt.days, decay), 6)
 
 def significance_compute(events: pd.DataFrame) -> pd.Series:
     assert events.equals(events.sort_values('id'))
@@ -0,0 +1,147 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import os
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+from scripts._transform import compute
+
+# The form of every player before every event they played in, i.e. the features of (pid, eid) only use
+# earlier events, over windows of the last N events and of the last D days. All windows are differences of
+# cumulative sums over the per-event table sorted by (pid, day), whose window starts are found by searchsorted.
+features_file = 'features.pkl'
+
+class FeatureStore(NamedTuple):
+    events_windows: tuple
+    days_windows  : tuple
+    base          : pd.DataFrame    # per (pid, eid): games, points W, opposition ratings, R and dR
+    features      : pd.DataFrame
+
+def _base(results: pd.DataFrame, activity: pd.DataFrame, events: pd.DataFrame) -> pd.DataFrame:
+    # the opposition average uses the ratings of the opponents before the event
+    before = (activity
+        .assign(R_before = lambda x: x.R - x.dR)
+        .loc[:, ['pid', 'eid', 'R_before']]
+        .rename(columns={'pid': 'pid2', 'R_before': 'opp_R'})
+    )
+    games = (results
+        .query('pid2 != 0 and not unplayed and W.notnull()')
+        .merge(before, how='left', on=['pid2', 'eid'], validate='many_to_one')
+        .groupby(['pid1', 'eid'])
+        .agg(
+            games = ('W', 'size'),
+            W     = ('W', 'sum'),
+            opp_R = ('opp_R', 'sum'),
+            opp_n = ('opp_R', 'count')
+        )
+        .reset_index()
+        .rename(columns={'pid1': 'pid'})
+    )
+    day = dict(zip(events.eid, (events.date - events.date.min()).dt.days))
+    return (activity
+        .loc[:, ['pid', 'eid', 'R', 'dR']]
+        .merge(games, how='outer', on=['pid', 'eid'], validate='one_to_one')
+        .fillna({'games': 0, 'W': 0.0, 'opp_R': 0.0, 'opp_n': 0})
+        .astype(dtype={'games': int, 'opp_n': int, 'R': float, 'dR': float})
+        .assign(day = lambda x: x.eid.map(day))
+        .sort_values(['pid', 'day', 'eid'])
+        .reset_index(drop=True)
+        .loc[:, ['pid', 'eid', 'day', 'games', 'W', 'opp_R', 'opp_n', 'R', 'dR']]
+    )
+
+def _features(base: pd.DataFrame, events_windows: Sequence[int], days_windows: Sequence[int], rows: np.ndarray) -> pd.DataFrame:
+    # the features of the given rows of base, with sums over the rows [lo, k) before every row k of a player
+    pid, day = base.pid.to_numpy(), base.day.to_numpy()
+    first = np.flatnonzero(np.r_[True, pid[1:] != pid[:-1]])
+    start = first[np.searchsorted(first, rows, side='right') - 1]
+    R = base.R.to_numpy()
+    rated = ~np.isnan(R)
+    x, y = np.where(rated, day, 0.0), np.where(rated, R, 0.0)
+    cs = {
+        column: np.r_[0.0, np.cumsum(values)]
+        for column, values in {
+            'games': base.games.to_numpy(dtype=float),
+            'W'    : base.W.to_numpy(dtype=float),
+            'opp_R': base.opp_R.to_numpy(dtype=float),
+            'opp_n': base.opp_n.to_numpy(dtype=float),
+            'dR'   : np.nan_to_num(base.dR.to_numpy(dtype=float)),
+            'n'    : rated.astype(float),
+            'x'    : x,
+            'y'    : y,
+            'xy'   : x * y,
+            'xx'   : x * x
+        }.items()
+    }
+    def window(lo: np.ndarray, suffix: str, trend: bool) -> dict:
+        s = {column: c[rows] - c[lo] for column, c in cs.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns = {
+                f'events_{suffix}': (rows - lo).astype(int),
+                f'games_{suffix}' : s['games'].astype(int),
+                f'score_{suffix}' : s['W'] / s['games'],
+                f'opp_R_{suffix}' : s['opp_R'] / s['opp_n'],
+                f'dR_{suffix}'    : s['dR']
+            }
+            if trend:
+                # the least-squares slope of the ratings against their dates, in rating points per year
+                spread = s['n'] * s['xx'] - s['x']**2
+                columns[f'trend_{suffix}'] = np.where(
+                    (s['n'] >= 2) & (spread > 0),
+                    (s['n'] * s['xy'] - s['x'] * s['y']) / spread * compute.tropical_year,
+                    np.nan
+                )
+        return columns
+    columns = {}
+    for N in events_windows:
+        columns.update(window(np.maximum(start, rows - N), f'{N}e', True))
+    stride = 1 + int(day.max(initial=0)) + max(days_windows, default=0)
+    key = pid * stride + day
+    for D in days_windows:
+        columns.update(window(np.maximum(start, np.searchsorted(key, key[rows] - D, side='left')), f'{D}d', False))
+    return (pd
+        .DataFrame({
+            'pid'     : pid[rows],
+            'eid'     : base.eid.to_numpy()[rows],
+            'days_off': np.where(rows > start, day[rows] - day[np.maximum(rows - 1, 0)], np.nan),
+            **columns
+        })
+    )
+
+def build(results: pd.DataFrame, activity: pd.DataFrame, events: pd.DataFrame, events_windows: Sequence[int] = (5, 10), days_windows: Sequence[int] = (365, 730)) -> FeatureStore:
+    base = _base(results, activity, events)
+    features = (
+        _features(base, events_windows, days_windows, np.arange(len(base.index)))
+        .sort_values(['pid', 'eid'])
+        .reset_index(drop=True)
+    )
+    return FeatureStore(tuple(events_windows), tuple(days_windows), base, features)
+
+def update(store: FeatureStore, results: pd.DataFrame, activity: pd.DataFrame, events: pd.DataFrame) -> FeatureStore:
+    # results and activity should only contain the rows of the newly added events, which are later than all others
+    assert results.eid.min() > store.base.eid.max()
+    base = (pd
+        .concat([store.base, _base(results, activity, events)], ignore_index=True)
+        .sort_values(['pid', 'day', 'eid'])
+        .reset_index(drop=True)
+    )
+    rows = np.flatnonzero(base.eid.to_numpy() > store.base.eid.max())
+    features = (pd
+        .concat([store.features, _features(base, store.events_windows, store.days_windows, rows)], ignore_index=True)
+        .sort_values(['pid', 'eid'])
+        .reset_index(drop=True)
+    )
+    return FeatureStore(store.events_windows, store.days_windows, base, features)
+
+def save(store: FeatureStore, idx_path: str) -> None:
+    os.makedirs(idx_path, exist_ok=True)
+    pd.to_pickle(store, os.path.join(idx_path, features_file))
+
+def load(idx_path: str) -> FeatureStore:
+    if not os.path.exists(os.path.join(idx_path, features_file)):
+        return None
+    return pd.read_pickle(os.path.join(idx_path, features_file))
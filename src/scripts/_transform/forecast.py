@@ -0,0 +1,110 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import concurrent.futures
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import scipy.stats as ss
+
+from scripts._transform import _reduce
+
+# the Kleier normal distribution for the expected score, as rating.pd_norm with rating.s_norm_0
+s_norm = 200 * np.sqrt(2)
+
+def win_probabilities(pid: np.ndarray, expected: pd.DataFrame, ratings: pd.DataFrame) -> np.ndarray:
+    # We[i, j] = the expected score W of player i against player j (Elo, 1978), where the scraped expected scores
+    # take precedence over those computed from the current ratings, and unrated players are evenly matched
+    R = ratings.set_index('pid').R.reindex(pid).to_numpy(dtype=float)
+    We = np.nan_to_num(ss.norm.cdf((R[:, None] - R[None, :]) / s_norm), nan=0.5)
+    pairs = expected.query('pid1 in @pid and pid2 in @pid')
+    index = pd.Index(pid)
+    We[index.get_indexer(pairs.pid1), index.get_indexer(pairs.pid2)] = pairs.We.to_numpy()
+    return We
+
+def draw_rate(results: pd.DataFrame) -> float:
+    return float(results.query('pid2 != 0 and not unplayed').W.eq(0.5).mean())
+
+def _round_robin(M: int) -> np.ndarray:
+    # the circle method, with M as the bye for an odd number of players, shaped rounds x games x 2
+    p = list(range(M)) + ([M] if M % 2 else [])
+    n = len(p)
+    rounds = []
+    for _ in range(n - 1):
+        rounds.append([(p[i], p[n - 1 - i]) for i in range(n // 2)])
+        p = [p[0]] + [p[-1]] + p[1:-1]
+    return np.array(rounds)
+
+def _batch(We: np.ndarray, draw: float, fmt: str, N: int, points: Dict[float, int], runs: int, seed: np.random.SeedSequence) -> np.ndarray:
+    # the number of times every player finishes at every rank in a batch of simulations, with all games of a round
+    # shaped simulations x games, and with index M as the bye, whose entries are only padding
+    rng = np.random.default_rng(seed)
+    M = len(We)
+    p_draw = np.minimum(draw, 2 * np.minimum(We, 1 - We))
+    p_win = np.pad(We - p_draw / 2, (0, 1))
+    p_loss = np.pad(We + p_draw / 2, (0, 1))
+    # the outcome of a game for a player: 0 = win, 1 = draw, 2 = loss, 3 = bye
+    values = np.array([points[1.0], points[0.5], points[0.0], 0])
+    schedule = None if fmt == 'SS' else _round_robin(M)
+    sims = np.arange(runs)[:, None]
+    opp = np.full((runs, N, M + 1), M, dtype=np.int16)
+    outcome = np.full((runs, N, M + 1), 3, dtype=np.int8)
+    score = np.zeros((runs, M + 1), dtype=values.dtype)
+    for r in range(N):
+        if schedule is not None:
+            # the same pairings in all simulations, and round robins with more rounds than a single cycle repeat it
+            a, b = schedule[r % len(schedule)].T
+            rows = slice(None)
+        else:
+            # Swiss pairings of neighbours in the current standings, in random order among equal scores
+            order = np.lexsort((rng.random((runs, M)), -score[:, :M]), axis=-1)
+            order = np.pad(order, ((0, 0), (0, M % 2)), constant_values=M)
+            a, b = order[:, 0::2], order[:, 1::2]
+            rows = sims
+        u = rng.random((runs, a.shape[-1]))
+        k = (u >= p_win[a, b]).astype(np.int8) + (u >= p_loss[a, b])
+        bye = (a == M) | (b == M)
+        opp[rows, r, a], opp[rows, r, b] = b, a
+        outcome[rows, r, a], outcome[rows, r, b] = np.where(bye, 3, k), np.where(bye, 3, 2 - k)
+        score[rows, a] += values[outcome[rows, r, a]]
+        score[rows, b] += values[outcome[rows, r, b]]
+    score[:, M] = 0
+    # score, median-Buchholz, Buchholz and direct-match results, as in tiebreaks.compute
+    opp, outcome, score1 = opp[:, :, :M], outcome[:, :, :M], score[:, :M]
+    played = opp != M
+    opp_score = np.take_along_axis(score, opp.reshape(runs, -1), axis=1).reshape(opp.shape)
+    buchholz = np.where(played, opp_score, 0).sum(axis=1)
+    hi = np.where(played, opp_score, np.iinfo(score.dtype).min).max(axis=1)
+    lo = np.where(played, opp_score, np.iinfo(score.dtype).max).min(axis=1)
+    median = np.where(played.sum(axis=1) >= 3, buchholz - hi - lo, 0)
+    tied = played & (opp_score == score1[:, None, :])
+    dmr_W = np.where(tied, values[outcome], 0).sum(axis=1)
+    order = np.lexsort((rng.random((runs, M)), -dmr_W, -buchholz, -median, -score1), axis=-1)
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(M)[None, :], axis=-1)
+    return np.bincount((np.arange(M)[None, :] * M + rank).ravel(), minlength=M * M).reshape(M, M)
+
+def simulate(We: np.ndarray, draw: float, fmt: str, N: int, points: Dict[float, int], runs: int = 100_000, jobs: int = 4, seed: int = 0, batch: int = 10_000) -> np.ndarray:
+    # P[i, k] = the probability that player i finishes at rank k + 1, where every batch has its own child seed,
+    # so that the probabilities do not depend on the number of jobs
+    sizes = [min(batch, runs - start) for start in range(0, runs, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [[We] * len(sizes), [draw] * len(sizes), [fmt] * len(sizes), [N] * len(sizes), [points] * len(sizes), sizes, seeds]
+    if jobs == 1:
+        counts = list(map(_batch, *args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            counts = list(pool.map(_batch, *args))
+    return sum(counts) / runs
+
+def forecast(eid: int, gid: int, groups: pd.DataFrame, standings: pd.DataFrame, expected: pd.DataFrame, ratings: pd.DataFrame, results: pd.DataFrame, runs: int = 100_000, jobs: int = 4, seed: int = 0) -> pd.DataFrame:
+    # the probability of every final rank for every player of a group, in the order of the scraped standings
+    group = groups.query('eid == @eid and gid == @gid').iloc[0]
+    pid = standings.query('eid == @eid and gid == @gid').pid.to_numpy()
+    fmt = str(_reduce._group_format(group.M, group.N))
+    points = {1.0: group.score_W, 0.5: group.score_D, 0.0: group.score_L}
+    P = simulate(win_probabilities(pid, expected, ratings), draw_rate(results), fmt, int(group.N), points, runs, jobs, seed)
+    return pd.DataFrame(P, index=pd.Index(pid, name='pid'), columns=pd.RangeIndex(1, len(pid) + 1, name='rank'))
@@ -0,0 +1,112 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+from typing import List, NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+
+# the undirected player-vs-player graph, indexed by pid, with the number of played games as edge weights,
+# together with the connected component of each pid (players without games form their own component)
+class OpponentGraph(NamedTuple):
+    adjacency: sp.csr_matrix
+    component: np.ndarray
+
+def _adjacency(results: pd.DataFrame, n: int) -> sp.csr_matrix:
+    edges = results.query('pid2 != 0 and not unplayed')
+    pid1, pid2 = edges.pid1.to_numpy(), edges.pid2.to_numpy()
+    n = max(n, 1 + int(max(pid1.max(initial=0), pid2.max(initial=0))))
+    # results lists each game from both sides, so that the adjacency matrix is symmetric
+    return sp.csr_matrix((np.ones(len(edges), dtype=int), (pid1, pid2)), shape=(n, n))
+
+def _resize(A: sp.csr_matrix, n: int) -> sp.csr_matrix:
+    A = A.copy()
+    A.resize((n, n))
+    return A
+
+def build(results: pd.DataFrame) -> OpponentGraph:
+    A = _adjacency(results, 0)
+    _, component = csgraph.connected_components(A, directed=False)
+    return OpponentGraph(A, component)
+
+def update(graph: OpponentGraph, results: pd.DataFrame) -> OpponentGraph:
+    # results should only contain the games of the newly added events
+    dA = _adjacency(results, graph.adjacency.shape[0])
+    n = dA.shape[0]
+    A = _resize(graph.adjacency, n) + dA
+    # new players start out in new components of their own
+    m = len(graph.component)
+    component = np.concatenate([graph.component, graph.component.max(initial=-1) + 1 + np.arange(n - m)])
+    # merge the old components that are connected through the new games
+    dA = dA.tocoo()
+    L = component.max() + 1
+    Q = sp.csr_matrix((np.ones_like(dA.data), (component[dA.row], component[dA.col])), shape=(L, L))
+    _, merged = csgraph.connected_components(Q, directed=False)
+    return OpponentGraph(A, merged[component])
+
+def degree(graph: OpponentGraph) -> np.ndarray:
+    # the number of distinct opponents
+    return np.diff(graph.adjacency.indptr)
+
+def shortest_path(graph: OpponentGraph, pid1: int, pid2: int) -> List[int]:
+    n = graph.adjacency.shape[0]
+    if not (0 < pid1 < n and 0 < pid2 < n) or graph.component[pid1] != graph.component[pid2]:
+        return []
+    _, predecessors = csgraph.shortest_path(
+        graph.adjacency, directed=False, unweighted=True, indices=pid1, return_predecessors=True
+    )
+    path = [pid2]
+    while path[-1] != pid1:
+        path.append(predecessors[path[-1]])
+    return [int(pid) for pid in reversed(path)]
+
+def players(graph: OpponentGraph) -> pd.DataFrame:
+    key = ['pid']
+    attributes = ['component', 'degree', 'games']
+    return (pd
+        .DataFrame({
+            'pid'      : np.arange(graph.adjacency.shape[0]),
+            'component': graph.component,
+            'degree'   : degree(graph),
+            'games'    : np.asarray(graph.adjacency.sum(axis=1)).ravel()
+        })
+        .query('degree > 0')
+        # number the components by decreasing size, so that component 0 is the main rating pool
+        .assign(component = lambda x: x.component
+            .map(x.component
+                .value_counts(sort=False)
+                .rename_axis('component')
+                .reset_index(name='size')
+                .sort_values(['size', 'component'], ascending=[False, True])
+                .reset_index(drop=True)
+                .reset_index()
+                .set_index('component')
+                .loc[:, 'index']
+            )
+        )
+        .loc[:, key + attributes]
+        .reset_index(drop=True)
+    )
+
+def components(graph: OpponentGraph) -> pd.DataFrame:
+    return (players(graph)
+        .groupby('component')
+        .agg(
+            players    = ('pid'   , 'size'),
+            min_pid    = ('pid'   , 'min' ),
+            games      = ('games' , 'sum' ),
+            edges      = ('degree', 'sum' ),
+            max_degree = ('degree', 'max' ),
+            avg_degree = ('degree', 'mean')
+        )
+        # each game and each edge is counted from both sides
+        .assign(
+            games = lambda x: x.games // 2,
+            edges = lambda x: x.edges // 2
+        )
+        .reset_index()
+    )
@@ -0,0 +1,113 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# pid x pid matrices in CSR format, all four sharing the same sparsity pattern,
+# so that row pid1 holds the record of player 1 against each of their opponents
+class HeadToHead(NamedTuple):
+    games: sp.csr_matrix    # number of played games
+    wins : sp.csr_matrix    # number of wins
+    draws: sp.csr_matrix    # number of draws
+    We   : sp.csr_matrix    # We = the expected score W (Elo, 1978), summed over all rated games
+
+def _counts(results: pd.DataFrame) -> pd.DataFrame:
+    return (results
+        .query('pid2 != 0 and not unplayed and W.notnull()')
+        .loc[:, ['pid1', 'pid2', 'W']]
+        .assign(
+            games = 1,
+            wins  = lambda x: (x.W == 1.0).astype(int),
+            draws = lambda x: (x.W == 0.5).astype(int)
+        )
+        .loc[:, ['pid1', 'pid2', 'games', 'wins', 'draws']]
+        .groupby(['pid1', 'pid2'])
+        .sum()
+        .reset_index()
+    )
+
+def _pairs(counts: pd.DataFrame, expected: pd.DataFrame) -> pd.DataFrame:
+    # expected holds one We per pair of players, from their current ratings, so that the sum over all
+    # rated games of a pair is its number of games times We, and changes whenever the ratings change
+    return (counts
+        .merge(expected
+            .loc[:, ['pid1', 'pid2', 'We']]
+            , how='left', on=['pid1', 'pid2'], validate='one_to_one'
+        )
+        .assign(We = lambda x: (x.games * x.We).fillna(0.0))
+        .loc[:, ['pid1', 'pid2'] + list(HeadToHead._fields)]
+    )
+
+def _from_pairs(pairs: pd.DataFrame, shape: tuple) -> HeadToHead:
+    indptr = np.searchsorted(pairs.pid1.to_numpy(), np.arange(shape[0] + 1))
+    indices = pairs.pid2.to_numpy()
+    return HeadToHead(*[
+        sp.csr_matrix((pairs[column].to_numpy(), indices, indptr), shape=shape)
+        for column in HeadToHead._fields
+    ])
+
+def _to_pairs(h2h: HeadToHead) -> pd.DataFrame:
+    indptr, indices = h2h.games.indptr, h2h.games.indices
+    return (pd
+        .DataFrame({
+            'pid1': np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)),
+            'pid2': indices
+        })
+        .assign(**{
+            column: getattr(h2h, column).data
+            for column in HeadToHead._fields
+        })
+    )
+
+def _shape(*pids: np.ndarray) -> tuple:
+    # pid = 0 is reserved for byes, so that pids can index the matrices directly
+    n = 1 + max(int(p.max(initial=0)) for p in pids)
+    return n, n
+
+def build(results: pd.DataFrame, expected: pd.DataFrame) -> HeadToHead:
+    pairs = _pairs(_counts(results), expected)
+    return _from_pairs(pairs, _shape(pairs.pid1.to_numpy(), pairs.pid2.to_numpy()))
+
+def update(h2h: HeadToHead, results: pd.DataFrame, expected: pd.DataFrame) -> HeadToHead:
+    # results should only contain the games of the newly added events, and expected should be the full table,
+    # since the counts of the old games are kept but their We is recomputed from the current ratings
+    counts = (pd
+        .concat([_to_pairs(h2h).drop(columns='We'), _counts(results)], ignore_index=True, sort=False)
+        .groupby(['pid1', 'pid2'])
+        .sum()
+        .reset_index()
+    )
+    pairs = _pairs(counts, expected)
+    n = max(h2h.games.shape[0], _shape(pairs.pid1.to_numpy(), pairs.pid2.to_numpy())[0])
+    return _from_pairs(pairs, (n, n))
+
+def record(h2h: HeadToHead, pid1: int, pid2: int) -> dict:
+    indptr, indices = h2h.games.indptr, h2h.games.indices
+    lo, hi = (indptr[pid1], indptr[pid1 + 1]) if pid1 < len(indptr) - 1 else (0, 0)
+    k = lo + np.searchsorted(indices[lo:hi], pid2)
+    found = k < hi and indices[k] == pid2
+    rec = {
+        column: getattr(h2h, column).data[k] if found else 0
+        for column in HeadToHead._fields
+    }
+    rec['losses'] = rec['games'] - rec['wins'] - rec['draws']
+    return rec
+
+def opponents(h2h: HeadToHead, pid: int) -> pd.DataFrame:
+    indptr, indices = h2h.games.indptr, h2h.games.indices
+    lo, hi = (indptr[pid], indptr[pid + 1]) if pid < len(indptr) - 1 else (0, 0)
+    return (pd
+        .DataFrame({'pid2': indices[lo:hi]})
+        .assign(**{
+            column: getattr(h2h, column).data[lo:hi]
+            for column in HeadToHead._fields
+        })
+        .assign(losses = lambda x: x.games - x.wins - x.draws)
+        .loc[:, ['pid2', 'games', 'wins', 'draws', 'losses', 'We']]
+    )
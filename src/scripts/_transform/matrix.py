@@ -0,0 +1,69 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# The rating of every player after every event as a dense float32 pid x eid matrix in a .npy file, with NaN
+# where a player has no rating, or with the latest rating carried forward. The matrix is stored in column-major
+# order, so that all ratings after an event are contiguous, and the pid and eid axes are stored alongside.
+name = 'ratings_matrix'
+
+class RatingMatrix(NamedTuple):
+    R  : np.ndarray     # R = a player's rating after a performance (Elo, 1978), memory-mapped
+    pid: np.ndarray     # the rated players, sorted
+    eid: np.ndarray     # all events, sorted
+
+def _file(idx_path: str, suffix: str) -> str:
+    return os.path.join(idx_path, f'{name}{suffix}.npy')
+
+def _matrix_file(idx_path: str, fill: bool) -> str:
+    return _file(idx_path, '_ffill' if fill else '')
+
+def write(history: pd.DataFrame, events: pd.DataFrame, idx_path: str, fill: bool = False) -> RatingMatrix:
+    # the matrix is filled in place in a temporary memory-mapped file, which then replaces any previous one
+    pid = np.unique(history.pid.to_numpy())
+    eid = events.eid.to_numpy()
+    assert (np.diff(eid) > 0).all()
+    os.makedirs(idx_path, exist_ok=True)
+    tmp = _matrix_file(idx_path, fill) + '.part'
+    R = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(len(pid), len(eid)), fortran_order=True)
+    R[:] = np.nan
+    R[np.searchsorted(pid, history.pid.to_numpy()), np.searchsorted(eid, history.eid.to_numpy())] = (
+        history.R.to_numpy(dtype=np.float32, na_value=np.nan)
+    )
+    if fill:
+        # one contiguous column at a time, without a temporary of the size of the matrix
+        for j in range(1, len(eid)):
+            np.copyto(R[:, j], R[:, j - 1], where=np.isnan(R[:, j]))
+    R.flush()
+    del R
+    os.replace(tmp, _matrix_file(idx_path, fill))
+    np.save(_file(idx_path, '_pid'), pid)
+    np.save(_file(idx_path, '_eid'), eid)
+    return load(idx_path, fill)
+
+def load(idx_path: str, fill: bool = False) -> RatingMatrix:
+    # zero-copy, only the pages that are read are loaded from disk
+    return RatingMatrix(
+        R   = np.load(_matrix_file(idx_path, fill), mmap_mode='r'),
+        pid = np.load(_file(idx_path, '_pid'), mmap_mode='r'),
+        eid = np.load(_file(idx_path, '_eid'), mmap_mode='r')
+    )
+
+def column(matrix: RatingMatrix, eid: int) -> np.ndarray:
+    # the ratings of all players after an event, as a contiguous view
+    j = np.searchsorted(matrix.eid, eid)
+    assert j < len(matrix.eid) and matrix.eid[j] == eid
+    return matrix.R[:, j]
+
+def row(matrix: RatingMatrix, pid: int) -> np.ndarray:
+    # the rating trajectory of a player across all events, as a strided view
+    i = np.searchsorted(matrix.pid, pid)
+    assert i < len(matrix.pid) and matrix.pid[i] == pid
+    return matrix.R[i, :]
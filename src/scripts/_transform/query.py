@@ -0,0 +1,126 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import os
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+# the primary keys of the normalized RDBS, as asserted in _normalize
+primary_keys = {
+    'tournaments': ['eid'],
+    'events'     : ['eid'],
+    'groups'     : ['eid', 'gid'],
+    'activity'   : ['pid', 'eid'],
+    'standings'  : ['eid', 'gid', 'pid'],
+    'results'    : ['eid', 'gid', 'round', 'pid1', 'pid2'],
+    'names'      : ['pid'],
+    'expected'   : ['pid1', 'pid2'],
+    'dates'      : ['date'],
+    'ratings'    : ['pid'],
+    'history'    : ['eid', 'pid']
+}
+
+# a sorted index on the (non-negative integer or date) key columns of a table,
+# packed into a single int64 code per row, so that lookups are a single searchsorted
+class Index(NamedTuple):
+    key    : List[str]
+    strides: np.ndarray
+    codes  : np.ndarray     # sorted
+    order  : np.ndarray     # the table row of each code
+
+def _column(s: pd.Series) -> np.ndarray:
+    # missing values are encoded as -1, and will never be found
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.to_numpy(dtype='datetime64[ns]').view('int64')
+    return s.to_numpy(dtype='int64', na_value=-1)
+
+def _encode(df: pd.DataFrame, on: Sequence[str], strides: np.ndarray) -> np.ndarray:
+    codes = np.zeros(len(df.index), dtype='int64')
+    valid = np.ones(len(df.index), dtype=bool)
+    for column, stride in zip(on, strides):
+        x = _column(df[column])
+        if stride:
+            valid &= (0 <= x) & (x < stride)
+            codes = codes * stride + x
+        else:
+            codes = x
+    return np.where(valid, codes, -1)
+
+def index(df: pd.DataFrame, key: Sequence[str]) -> Index:
+    # a single column (e.g. a date) is used as is, multiple columns are packed in mixed radix
+    strides = np.array([
+        0 if len(key) == 1 else 1 + int(_column(df[column]).max(initial=0))
+        for column in key
+    ], dtype='int64')
+    codes = _encode(df, key, strides)
+    order = np.arange(len(codes)) if np.all(codes[:-1] <= codes[1:]) else np.argsort(codes, kind='stable')
+    return Index(list(key), strides, codes[order], order)
+
+def lookup(idx: Index, df: pd.DataFrame, on: Sequence[str] = None) -> np.ndarray:
+    # the table row matching each row of df, or -1 if there is none
+    codes = _encode(df, on or idx.key, idx.strides)
+    pos = np.searchsorted(idx.codes, codes).clip(max=max(len(idx.codes) - 1, 0))
+    found = (codes != -1) & (idx.codes[pos] == codes) if len(idx.codes) else np.zeros(len(codes), dtype=bool)
+    return np.where(found, idx.order[pos] if len(idx.order) else -1, -1)
+
+def take(df: pd.DataFrame, rows: np.ndarray) -> pd.DataFrame:
+    # positional take, with missing rows (-1) filled with NaN
+    df = df.reset_index(drop=True)
+    return df.iloc[rows] if (rows >= 0).all() else df.reindex(rows)
+
+def join(left: pd.DataFrame, right: pd.DataFrame, idx: Index, left_on: Sequence[str] = None, suffix: str = '') -> pd.DataFrame:
+    # a many-to-one left join of a foreign key on the primary key index of right
+    rows = lookup(idx, left, left_on)
+    attributes = [
+        column
+        for column in right.columns.to_list()
+        if not column in idx.key
+    ]
+    return pd.concat([
+            left,
+            take(right.loc[:, attributes], rows)
+            .add_suffix(suffix)
+            .set_axis(left.index, axis='index')
+        ],
+        axis='columns'
+    )
+
+class Database:
+    def __init__(self, datasets: Dict[str, pd.DataFrame]):
+        self.datasets = datasets
+        self._indexes = {}
+
+    @classmethod
+    def read_pickle(cls, pkl_path: str) -> 'Database':
+        return cls({
+            name: pd.read_pickle(os.path.join(pkl_path, name + '.pkl'))
+            for name in primary_keys
+        })
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        return self.datasets[name]
+
+    def index(self, name: str, key: Sequence[str] = None) -> Index:
+        key = tuple(key or primary_keys[name])
+        if not (name, key) in self._indexes:
+            self._indexes[(name, key)] = index(self.datasets[name], key)
+        return self._indexes[(name, key)]
+
+    def join(self, left: pd.DataFrame, name: str, left_on: Sequence[str] = None, suffix: str = '') -> pd.DataFrame:
+        return join(left, self.datasets[name], self.index(name), left_on, suffix)
+
+# the joins that are common throughout the analysis code
+
+def results_groups(db: Database) -> pd.DataFrame:
+    return db.join(db['results'], 'groups')
+
+def results_activity(db: Database, side: int = 1) -> pd.DataFrame:
+    # the activity of player 1 or player 2, e.g. R1 = the rating of player 1 after the event
+    return db.join(db['results'], 'activity', left_on=[f'pid{side}', 'eid'], suffix=str(side))
+
+def history_events(db: Database) -> pd.DataFrame:
+    return db.join(db['history'], 'events')
@@ -0,0 +1,215 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+from typing import Callable, Dict, NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.special as sc
+
+from scripts._transform import compute
+
+# Every rating system keeps its per-player state in arrays indexed by pid, and its kernel updates the state
+# with all games of an event at once, i.e. an event is a rating period, with its day as the number of days
+# since the first event. A player who plays in several groups of an event, e.g. a preliminary and a final,
+# has all these games in one batch, as the Kleier ratings are also only updated once per event. Every game
+# appears twice in the batch, once from the side of each player, and the kernel returns the expected score
+# of player 1 before the event.
+class System(NamedTuple):
+    init  : Callable[[int, dict], Dict[str, np.ndarray]]
+    update: Callable[[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray, int, float, dict], np.ndarray]
+    params: dict
+
+class Replay(NamedTuple):
+    history: pd.DataFrame   # the state of every player after every event they played in
+    games  : pd.DataFrame   # every played game with the expected score We of player 1 before its event
+
+# the distribution of the expected score and its default scale, as rating.pd_norm with rating.s_norm_0
+# and rating.pd_logistic with rating.s_logistic_0
+links = {
+    'norm'    : (sc.ndtr , 200 * np.sqrt(2)),
+    'logistic': (sc.expit, 400 / np.log(10))
+}
+
+def _elo_init(n: int, p: dict) -> Dict[str, np.ndarray]:
+    return {
+        'R'   : np.full(n, p['R0']),
+        'last': np.full(n, np.nan)
+    }
+
+def _elo(state: Dict[str, np.ndarray], i: np.ndarray, j: np.ndarray, W: np.ndarray, period: int, day: float, p: dict) -> np.ndarray:
+    # Elo (1978), by default with the Kleier normal distribution for the expected score
+    R = state['R']
+    cdf, s = links[p['link']]
+    if p['decay'] is not None:
+        # the ratings of returning players regress to the mean with the date significance of their last event
+        players = np.unique(i)
+        idle = day - state['last'][players]
+        R[players] = p['R0'] + (R[players] - p['R0']) * np.nan_to_num(compute.days_significance(idle, p['decay']), nan=1.0)
+        state['last'][players] = day
+    We = cdf((R[i] - R[j]) / (p['s'] or s))
+    R += p['K'] * np.bincount(i, W - We, len(R))
+    return We
+
+# Glickman (2012), Example of the Glicko-2 system, with ratings on the Glicko scale
+glicko_scale = 400 / np.log(10)
+
+def _glicko2_init(n: int, p: dict) -> Dict[str, np.ndarray]:
+    return {
+        'R'    : np.full(n, p['R0']),
+        'RD'   : np.full(n, p['RD0']),
+        'sigma': np.full(n, p['sigma0']),
+        'last' : np.full(n, -1)
+    }
+
+def _volatility(phi: np.ndarray, sigma: np.ndarray, v: np.ndarray, delta: np.ndarray, tau: float, eps: float = 1e-6) -> np.ndarray:
+    # step 5, the Illinois algorithm for all players at once
+    a = np.log(sigma**2)
+    def f(x: np.ndarray) -> np.ndarray:
+        ex = np.exp(x)
+        return ex * (delta**2 - phi**2 - v - ex) / (2 * (phi**2 + v + ex)**2) - (x - a) / tau**2
+    A = a
+    B = np.where(delta**2 > phi**2 + v, np.log(np.maximum(delta**2 - phi**2 - v, np.finfo(float).tiny)), np.nan)
+    k = 1
+    while np.isnan(B).any():
+        B = np.where(np.isnan(B) & (f(a - k * tau) >= 0), a - k * tau, B)
+        k += 1
+    fA, fB = f(A), f(B)
+    active = np.abs(B - A) > eps
+    while active.any():
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        swap = active & (fC * fB <= 0)
+        A, fA = np.where(swap, B, A), np.where(swap, fB, np.where(active, fA / 2, fA))
+        B, fB = np.where(active, C, B), np.where(active, fC, fB)
+        active = np.abs(B - A) > eps
+    return np.exp(A / 2)
+
+def _glicko2(state: Dict[str, np.ndarray], i: np.ndarray, j: np.ndarray, W: np.ndarray, period: int, day: float, p: dict) -> np.ndarray:
+    n = len(state['R'])
+    players = np.unique(i)
+    mu, phi, sigma = (state['R'] - p['R0']) / glicko_scale, state['RD'] / glicko_scale, state['sigma']
+    # step 6 for the rating periods without games since the last event of every player
+    idle = np.where(state['last'][players] < 0, 0, period - state['last'][players] - 1)
+    phi[players] = np.minimum(np.sqrt(phi[players]**2 + idle * sigma[players]**2), p['RD0'] / glicko_scale)
+    # steps 3 and 4
+    g = 1 / np.sqrt(1 + 3 * phi[j]**2 / np.pi**2)
+    E = sc.expit(g * (mu[i] - mu[j]))
+    v = 1 / np.bincount(i, g**2 * E * (1 - E), n)[players]
+    gain = np.bincount(i, g * (W - E), n)[players]
+    # steps 5 to 8
+    sigma1 = _volatility(phi[players], sigma[players], v, v * gain, p['tau'])
+    phi1 = 1 / np.sqrt(1 / (phi[players]**2 + sigma1**2) + 1 / v)
+    state['R'][players] = p['R0'] + glicko_scale * (mu[players] + phi1**2 * gain)
+    state['RD'][players] = glicko_scale * phi1
+    state['sigma'][players] = sigma1
+    state['last'][players] = period
+    return E
+
+# Herbrich et al. (2007), TrueSkill: A Bayesian skill rating system, for games between two players
+def _trueskill_init(n: int, p: dict) -> Dict[str, np.ndarray]:
+    return {
+        'R'    : np.full(n, p['R0']),
+        'sigma': np.full(n, p['sigma0'])
+    }
+
+def _ratio(x: np.ndarray) -> np.ndarray:
+    # pdf(x) / cdf(x) of the standard normal distribution, stable for large negative x
+    return np.exp(-x**2 / 2 - np.log(np.sqrt(2 * np.pi)) - sc.log_ndtr(x))
+
+def _trueskill(state: Dict[str, np.ndarray], i: np.ndarray, j: np.ndarray, W: np.ndarray, period: int, day: float, p: dict) -> np.ndarray:
+    n = len(state['R'])
+    players = np.unique(i)
+    R, sigma2 = state['R'], state['sigma']**2
+    sigma2[players] += p['tau']**2
+    c = np.sqrt(2 * p['beta']**2 + sigma2[i] + sigma2[j])
+    t = (R[i] - R[j]) / c
+    # the draw margin that gives two equal players the draw probability
+    e = sc.ndtri((p['draw'] + 1) / 2) * np.sqrt(2) * p['beta'] / c
+    sign = np.sign(W - 0.5)
+    x = sign * t - e
+    v_decisive = _ratio(x)
+    w_decisive = v_decisive * (v_decisive + x)
+    a, b = e - t, -e - t
+    Z = np.maximum(sc.ndtr(a) - sc.ndtr(b), np.finfo(float).tiny)
+    pdf_a, pdf_b = np.exp(-a**2 / 2) / np.sqrt(2 * np.pi), np.exp(-b**2 / 2) / np.sqrt(2 * np.pi)
+    v_draw = (pdf_b - pdf_a) / Z
+    w_draw = v_draw**2 + (a * pdf_a - b * pdf_b) / Z
+    v = np.where(sign == 0, v_draw, sign * v_decisive)
+    w = np.where(sign == 0, w_draw, w_decisive)
+    We = sc.ndtr(t - e) + (sc.ndtr(e - t) - sc.ndtr(-e - t)) / 2
+    # the games of a batch are independent factors, whose messages are added in natural parameters,
+    # since adding the mean and variance updates of each game on its own overshoots for many games per event
+    s2 = sigma2[i]
+    s2_game = s2 * (1 - s2 / c**2 * w)
+    pi = 1 / sigma2 + np.bincount(i, 1 / s2_game - 1 / s2, n)
+    tau = R / sigma2 + np.bincount(i, (R[i] + s2 / c * v) / s2_game - R[i] / s2, n)
+    state['R'] = tau / pi
+    state['sigma'] = np.sqrt(1 / pi)
+    return We
+
+systems = {
+    'elo'      : System(_elo_init      , _elo      , {'R0': 1500.0, 'K': 20.0, 'link': 'norm', 's': None, 'decay': None}),
+    'glicko2'  : System(_glicko2_init  , _glicko2  , {'R0': 1500.0, 'RD0': 350.0, 'sigma0': 0.06, 'tau': 0.5}),
+    'trueskill': System(_trueskill_init, _trueskill, {'R0': 1500.0, 'sigma0': 500.0, 'beta': 250.0, 'tau': 5.0, 'draw': 0.1})
+}
+
+def metrics(W: np.ndarray, We: np.ndarray) -> dict:
+    # a draw counts as half a win, and the accuracy only counts decisive games with a predicted winner,
+    # where We is clipped so that the log loss of a saturated prediction stays finite
+    We = np.clip(We, 1e-12, 1 - 1e-12)
+    decisive = (W != 0.5) & (We != 0.5)
+    return {
+        'games'   : len(W),
+        'log_loss': -np.mean(W * np.log(We) + (1 - W) * np.log(1 - We)),
+        'brier'   : np.mean((W - We)**2),
+        'accuracy': np.mean((We[decisive] > 0.5) == (W[decisive] == 1.0))
+    }
+
+def games(results: pd.DataFrame, events: pd.DataFrame) -> pd.DataFrame:
+    # the played games in event order, which is also date order, with the day of their event
+    assert events.eid.is_monotonic_increasing and events.date.is_monotonic_increasing
+    return (results
+        .query('pid2 != 0 and not unplayed and W.notnull()')
+        .loc[:, ['eid', 'pid1', 'pid2', 'W']]
+        .sort_values('eid', kind='stable')
+        .reset_index(drop=True)
+        .assign(day = lambda x: x.eid.map(dict(zip(events.eid, (events.date - events.date.min()).dt.days))).astype(float))
+    )
+
+def run(system: str, params: dict, eid: np.ndarray, day: np.ndarray, pid1: np.ndarray, pid2: np.ndarray, W: np.ndarray, history: bool = True) -> tuple:
+    # the expected scores of all games before their event, and optionally the state after every event, as arrays
+    init, update, defaults = systems[system]
+    assert set(params) <= set(defaults), f'unknown parameters of {system}: {sorted(set(params) - set(defaults))}'
+    p = {**defaults, **params}
+    n = 1 + int(max(pid1.max(initial=0), pid2.max(initial=0)))
+    state = init(n, p)
+    columns = [column for column in state if column != 'last']
+    We = np.empty(len(W))
+    bounds = np.flatnonzero(np.r_[True, eid[1:] != eid[:-1], True])
+    states = {column: [] for column in ['pid', 'eid'] + columns}
+    for period, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        batch = slice(start, stop)
+        We[batch] = update(state, pid1[batch], pid2[batch], W[batch], period, day[start], p)
+        if history:
+            players = np.unique(pid1[batch])
+            states['pid'].append(players)
+            states['eid'].append(np.full(len(players), eid[start]))
+            for column in columns:
+                states[column].append(state[column][players])
+    return We, states
+
+def replay(results: pd.DataFrame, events: pd.DataFrame, system: str = 'elo', **params) -> Replay:
+    df = games(results, events)
+    We, states = run(system, params, *(df[column].to_numpy() for column in ['eid', 'day', 'pid1', 'pid2']), df.W.to_numpy(dtype=float))
+    history = (pd
+        .DataFrame({
+            column: np.concatenate(arrays) if arrays else np.array([])
+            for column, arrays in states.items()
+        })
+        .sort_values(['pid', 'eid'], kind='stable')
+        .reset_index(drop=True)
+    )
+    return Replay(history, df.drop(columns='day').assign(We = We))
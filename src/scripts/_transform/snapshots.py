@@ -0,0 +1,103 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from scripts._transform import compute
+
+# the rating history sorted by (pid, eid), with a composite search key pid * stride + eid,
+# so that the latest rating of every player as of any event is a single vectorized searchsorted
+class Snapshots(NamedTuple):
+    dates    : np.ndarray   # event dates, sorted
+    eids     : np.ndarray   # event ids, in the same order as the dates
+    stride   : int
+    key      : np.ndarray   # pid * stride + eid, sorted
+    R        : np.ndarray   # R = a player's rating after a performance (Elo, 1978)
+    eff_games: np.ndarray   # as of the last event the player played in
+    played   : np.ndarray   # the date of that event
+    pid      : np.ndarray   # the rated players, sorted
+    start    : np.ndarray   # the first row of each rated player
+    nat      : np.ndarray
+
+def build(history: pd.DataFrame, events: pd.DataFrame, activity: pd.DataFrame, names: pd.DataFrame) -> Snapshots:
+    assert events.equals(events.sort_values(['date', 'eid']))
+    stride = 1 + int(events.eid.max())
+    df = (history
+        .loc[:, ['pid', 'eid', 'R']]
+        .merge(activity
+            .loc[:, ['pid', 'eid', 'eff_games']]
+            .merge(events
+                .loc[:, ['eid', 'date']]
+                .rename(columns={'date': 'played'})
+                , how='left', on='eid', validate='many_to_one'
+            )
+            , how='outer', on=['pid', 'eid'], validate='one_to_one'
+        )
+        .sort_values(['pid', 'eid'])
+        .reset_index(drop=True)
+        .assign(
+            R         = lambda x: x.groupby('pid').R.ffill(),
+            eff_games = lambda x: x.groupby('pid').eff_games.ffill(),
+            played    = lambda x: x.groupby('pid').played.ffill()
+        )
+        .query('R.notnull()')
+        .reset_index(drop=True)
+    )
+    pid = df.pid.to_numpy()
+    first = np.flatnonzero(np.r_[True, pid[1:] != pid[:-1]])
+    return Snapshots(
+        dates     = events.date.to_numpy(),
+        eids      = events.eid.to_numpy(),
+        stride    = stride,
+        key       = pid * stride + df.eid.to_numpy(),
+        R         = df.R.to_numpy(dtype=int),
+        eff_games = df.eff_games.to_numpy(dtype=float, na_value=np.nan),
+        played    = df.played.to_numpy(),
+        pid       = pid[first],
+        start     = first,
+        nat       = (names
+            .set_index('pid')
+            .nat
+            .reindex(pid[first])
+            .to_numpy()
+        )
+    )
+
+def ratings_as_of(snapshots: Snapshots, date) -> pd.DataFrame:
+    key = ['pid']
+    attributes = ['nat', 'R', 'int_rank', 'nat_rank', 'eff_games']
+    s = snapshots
+    date = np.datetime64(pd.Timestamp(date), 'ns')
+    n = np.searchsorted(s.dates, date, side='right')
+    eid = s.eids[n - 1] if n else 0
+    # the latest row at or before eid, which is only valid if it belongs to the same player
+    row = np.searchsorted(s.key, s.pid * s.stride + eid, side='right') - 1
+    rated = row >= s.start
+    row = row[rated]
+    # the effective games decay from the last event played to the query date, see compute.days_significance;
+    # games before that event decay a little faster than this, so the decayed count is an upper bound
+    days = (date - s.played[row]) / np.timedelta64(1, 'D')
+    return (pd
+        .DataFrame({
+            'pid'      : s.pid[rated],
+            'nat'      : s.nat[rated],
+            'R'        : s.R[row],
+            'eff_games': np.round(s.eff_games[row] * compute.days_significance(days), 3)
+        })
+        .sort_values(['R', 'pid'], ascending=[False, True])
+        .reset_index(drop=True)
+        # only players with at least 5 effective games are ranked, see _normalize._ratings
+        .pipe(lambda x: x
+            .assign(
+                int_rank = x.R.where(x.eff_games >= 5.0).rank(ascending=False, method='first'),
+                nat_rank = x.R.where(x.eff_games >= 5.0).groupby(x.nat).rank(ascending=False, method='first')
+            )
+        )
+        .astype(dtype={column: 'Int64' for column in ['R', 'int_rank', 'nat_rank']})
+        .loc[:, key + attributes]
+    )
@@ -0,0 +1,85 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import numpy as np
+import pandas as pd
+import scipy.optimize as so
+import scipy.sparse as sp
+import scipy.sparse.linalg as spl
+import scipy.stats as ss
+
+from scripts._transform import compute
+
+# Thurstone (norm) and Bradley-Terry (logistic) links and their scales, as rating.pd_norm with rating.s_norm_0
+# and rating.pd_logistic with rating.s_logistic_0
+links = {
+    'norm'    : (ss.norm    , 200 * np.sqrt(2)),
+    'logistic': (ss.logistic, 400 / np.log(10))
+}
+
+def _games(results: pd.DataFrame, events: pd.DataFrame, decay: bool) -> pd.DataFrame:
+    # results lists each game from both sides, of which only the side with pid1 < pid2 is kept
+    games = results.query('pid2 != 0 and not unplayed and W.notnull() and pid1 < pid2')
+    if not decay:
+        return games.assign(weight = 1.0)
+    significance = compute.date_significance(events.date, events.date.max())
+    return games.assign(weight = lambda x: x.eid.map(dict(zip(events.eid, significance))))
+
+def _derivatives(dist, z: np.ndarray, W: np.ndarray, w: np.ndarray) -> tuple:
+    # the weighted log-likelihood of W ~ dist.cdf(z), where a draw counts as half a win, and its first two derivatives
+    log_F, log_S, log_f = dist.logcdf(z), dist.logsf(z), dist.logpdf(z)
+    fF, fS = np.exp(log_f - log_F), np.exp(log_f - log_S)
+    # the derivative of the pdf divided by the pdf
+    df = -z if dist is ss.norm else -np.tanh(z / 2)
+    l   = w * (W * log_F + (1 - W) * log_S)
+    dl  = w * (W * fF - (1 - W) * fS)
+    d2l = w * (W * fF * (df - fF) - (1 - W) * fS * (df + fS))
+    return l, dl, d2l
+
+def _inverse_diagonal(H: sp.csc_matrix, block: int = 256) -> np.ndarray:
+    # the diagonal of the inverse of a sparse positive definite matrix, from a single sparse LU factorization
+    # that is solved for blocks of unit vectors, without ever forming the dense matrix or its full inverse
+    lu = spl.splu(H, permc_spec='MMD_AT_PLUS_A')
+    n = H.shape[0]
+    diagonal = np.empty(n)
+    for lo in range(0, n, block):
+        k = np.arange(lo, min(lo + block, n))
+        E = np.zeros((n, len(k)))
+        E[k, k - lo] = 1.0
+        diagonal[k] = lu.solve(E)[k, k - lo]
+    return diagonal
+
+def fit(results: pd.DataFrame, events: pd.DataFrame, link: str = 'norm', decay: bool = False, mu: float = 1500.0, sigma: float = 400.0, se: bool = True) -> pd.DataFrame:
+    # the maximum a posteriori strengths R of all players at once, with a N(mu, sigma) prior that also fixes
+    # the otherwise arbitrary offset, and optionally standard errors from the diagonal of the inverse Hessian
+    dist, s = links[link]
+    games = _games(results, events, decay)
+    pid, codes = np.unique(games.loc[:, ['pid1', 'pid2']].to_numpy(), return_inverse=True)
+    codes = codes.reshape(-1, 2)
+    n, m = len(pid), len(games.index)
+    # the sparse design matrix, with z = X @ R / s as the scaled rating difference of every game
+    X = sp.csr_matrix((np.tile([1.0, -1.0], m), codes.ravel(), np.arange(0, 2 * m + 1, 2)), shape=(m, n))
+    W, w = games.W.to_numpy(dtype=float), games.weight.to_numpy(dtype=float)
+
+    def objective(R: np.ndarray) -> tuple:
+        l, dl, _ = _derivatives(dist, X @ R / s, W, w)
+        return -l.sum() + ((R - mu)**2).sum() / (2 * sigma**2), -(X.T @ dl) / s + (R - mu) / sigma**2
+
+    def hessian(R: np.ndarray) -> sp.csc_matrix:
+        _, _, d2l = _derivatives(dist, X @ R / s, W, w)
+        return ((X.T @ sp.diags(-d2l) @ X) / s**2 + sp.identity(n) / sigma**2).tocsc()
+
+    def hessp(R: np.ndarray, v: np.ndarray) -> np.ndarray:
+        _, _, d2l = _derivatives(dist, X @ R / s, W, w)
+        return X.T @ (-d2l * (X @ v)) / s**2 + v / sigma**2
+
+    result = so.minimize(objective, np.full(n, mu), jac=True, hessp=hessp, method='Newton-CG', options={'xtol': 1e-8})
+    assert result.success, result.message
+    return pd.DataFrame({
+        'pid'  : pid,
+        'games': np.bincount(codes.ravel(), minlength=n),
+        'R'    : result.x,
+        'se'   : np.sqrt(_inverse_diagonal(hessian(result.x))) if se else np.nan
+    })
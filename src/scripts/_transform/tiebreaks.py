@@ -0,0 +1,81 @@
+#          Copyright Rein Halbersma 2019-2021.
+# Distributed under the Boost Software License, Version 1.0.
+#    (See accompanying file LICENSE_1_0.txt or copy at
+#          http://www.boost.org/LICENSE_1_0.txt)
+
+import numpy as np
+import pandas as pd
+
+key = ['eid', 'gid', 'pid']
+
+columns = ['score', 'median', 'buchholz', 'dmr_W', 'dmr_N']
+
+def _codes(eid: np.ndarray, gid: np.ndarray, pid: np.ndarray) -> np.ndarray:
+    # (eid, gid, pid) packed into a single integer that sorts in the same order
+    return (eid.astype(np.int64) << 40) | (gid.astype(np.int64) << 24) | pid.astype(np.int64)
+
+def _starts(codes: np.ndarray) -> np.ndarray:
+    # the first position of every segment of equal values in a sorted array
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+def compute(results: pd.DataFrame, groups: pd.DataFrame) -> pd.DataFrame:
+    # score, median-Buchholz, Buchholz and direct-match results (among players with an equal score)
+    # for every player in every group, as segment reductions over the games sorted by (eid, gid, pid1)
+    codes1 = _codes(results.eid.to_numpy(), results.gid.to_numpy(), results.pid1.to_numpy())
+    order = np.argsort(codes1, kind='stable')
+    codes1 = codes1[order]
+    codes2 = _codes(results.eid.to_numpy(), results.gid.to_numpy(), results.pid2.to_numpy())[order]
+    W = results.W.to_numpy(dtype=float)[order]
+    starts = _starts(codes1)
+    players = codes1[starts]
+    M = len(players)
+    seg = np.cumsum(np.r_[False, codes1[1:] != codes1[:-1]])
+
+    # the points of a game depend on the scoring of its group
+    group_codes = _codes(groups.eid.to_numpy(), groups.gid.to_numpy(), np.zeros(len(groups.index), dtype=np.int64))
+    g = np.searchsorted(group_codes, codes1 >> 24 << 24)
+    assert (group_codes[g] == codes1 >> 24 << 24).all()
+    pts = np.select(
+        [W == 1.0, W == 0.5, W == 0.0],
+        [groups.score_W.to_numpy()[g], groups.score_D.to_numpy()[g], groups.score_L.to_numpy()[g]],
+        0
+    )
+    score = np.add.reduceat(pts, starts)
+
+    # byes have no opponent, and do not count towards the Buchholz and direct-match results
+    played = (codes2 & 0xFFFFFF) != 0
+    seg, pts = seg[played], pts[played]
+    opp_seg = np.searchsorted(players, codes2[played])
+    assert (players[opp_seg] == codes2[played]).all()
+    opp = score[opp_seg].astype(float)
+    buchholz = np.bincount(seg, opp, M)
+    hi, lo, opp_starts = np.zeros(M), np.zeros(M), _starts(seg)
+    hi[seg[opp_starts]] = np.maximum.reduceat(opp, opp_starts)
+    lo[seg[opp_starts]] = np.minimum.reduceat(opp, opp_starts)
+    # the highest and lowest opponent scores are only dropped when at least one other opponent remains
+    median = np.where(np.bincount(seg, minlength=M) >= 3, buchholz - hi - lo, 0.0)
+    tied = score[seg] == score[opp_seg]
+    dmr_W = np.bincount(seg[tied], pts[tied], M).astype(int)
+    dmr_N = np.bincount(seg[tied], minlength=M)
+    return pd.DataFrame({
+        'eid'     : players >> 40,
+        'gid'     : players >> 24 & 0xFFFF,
+        'pid'     : players & 0xFFFFFF,
+        'score'   : score,
+        'median'  : median,
+        'buchholz': buchholz,
+        'dmr_W'   : dmr_W,
+        'dmr_N'   : dmr_N
+    })
+
+def mismatches(standings: pd.DataFrame, tiebreaks: pd.DataFrame) -> pd.DataFrame:
+    # the players whose scraped tie-breaks differ from the recomputed ones, which are suffixed with an underscore
+    df = (standings
+        .loc[:, key + columns]
+        .merge(tiebreaks, how='outer', on=key, suffixes=('', '_'), validate='one_to_one')
+    )
+    differ = np.logical_or.reduce([
+        ~np.isclose(df[column].to_numpy(dtype=float), df[column + '_'].to_numpy(dtype=float))
+        for column in columns
+    ])
+    return df[differ].reset_index(drop=True)
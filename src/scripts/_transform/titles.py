@@ -7,6 +7,7 @@ import numpy as np
 import pandas as pd
 
 from scripts._extract import _fetch
+from scripts._transform import query
 
 delta           = 800
 
@@ -52,21 +53,10 @@ min_rating_WGM  = 2300 - delta
 min_rating_WIM  = 2200 - delta
 
 def min_rating(results: pd.DataFrame, names: pd.DataFrame, events: pd.DataFrame, activity: pd.DataFrame) -> pd.DataFrame:
+    idx = query.index(activity, query.primary_keys['activity'])
     df = (results
-        .merge(activity
-            .loc[:, ['pid', 'eid', 'R']]
-            .rename(columns={
-                'pid': 'pid1',
-                'R'  : 'R1'
-            })
-        )
-        .merge(activity
-            .loc[:, ['pid', 'eid', 'R']]
-            .rename(columns={
-                'pid': 'pid2',
-                'R'  : 'R2'
-            })
-        )
+        .pipe(query.join, activity.loc[:, ['pid', 'eid', 'R']], idx, ['pid1', 'eid'], '1')
+        .pipe(query.join, activity.loc[:, ['pid', 'eid', 'R']], idx, ['pid2', 'eid'], '2')
         .assign(rated = lambda x: np.where(x.unplayed | x.R1.isnull() | x.R2.isnull(), 0, 1))
         .loc[:, ['pid1', 'eid', 'rated']]
         .rename(columns={'pid1': 'pid'})
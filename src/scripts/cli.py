@@ -3,17 +3,39 @@
 #    (See accompanying file LICENSE_1_0.txt or copy at
 #          http://www.boost.org/LICENSE_1_0.txt)
 
+import concurrent.futures
 import os
+import time
 
 import click
 import pandas as pd
 
+from scripts._benchmark import _corpus
+from scripts._benchmark import _suite
 from scripts._extract import _fetch
+from scripts._extract import _manifest
 from scripts._extract import _scan
+from scripts._extract import _server
+from scripts._extract import _store
+from scripts._load import _sql
+from scripts._transform import _chunked
+from scripts._transform import _dag
 from scripts._transform import _format
+from scripts._transform import _incremental
 from scripts._transform import _normalize
 from scripts._transform import _parse
+from scripts._transform import _profile
 from scripts._transform import _reduce
+from scripts._transform import backtest
+from scripts._transform import features
+from scripts._transform import forecast
+from scripts._transform import graph
+from scripts._transform import headtohead
+from scripts._transform import matrix
+from scripts._transform import replay
+from scripts._transform import snapshots
+from scripts._transform import strengths
+from scripts._transform import tiebreaks
 
 dataset_names = [
     'tournaments',
@@ -29,35 +51,66 @@ dataset_names = [
     'history'
 ]
 
-def _do_extract(html_path: str) -> None:
+def _do_extract(html_path: str, base_url: str = _fetch.base_url, resume: bool = False, jobs: int = 4, shards: bool = True) -> None:
+    manifest = _manifest.load(html_path) if resume else None
+    if resume:
+        click.echo(f'Resuming from {len(manifest)} files in the manifest.')
     click.echo('Fetching the list of tournaments.')
-    _fetch._tournaments(html_path)
+    _fetch._tournaments(html_path, base_url=base_url, manifest=manifest)
     click.echo('Scanning the number of tournaments: ', nl=False)
     eid_seq = _scan._tourn_tables(html_path)
     click.echo(f'{len(eid_seq)}')
     assert min(eid_seq) == 1
     assert max(eid_seq) == len(eid_seq)
-    with click.progressbar(eid_seq, label=f'Fetching {len(eid_seq)} tournament tables:') as bar:
-        for eid in bar:
-            _fetch._tourn_table(eid, html_path)
-    click.echo('Scanning the number of players: ', nl=False)
-    pid_seq = range(1, 1 + max(_scan._players(html_path)))
-    click.echo(f'{len(pid_seq)}')
-    with click.progressbar(pid_seq, label=f'Fetching {len(pid_seq)} player histories:') as bar:
-        for pid in bar:
-            _fetch._player(pid, html_path)
-    click.echo('Fetching the rating history.')
-    _fetch._rat_table(html_path, games=0, ntourn=len(eid_seq), items=len(eid_seq)*len(pid_seq))
-
-def _do_parse(html_path: str, pkl_path: str) -> None:
+    # the player ids are scanned from each tournament table as it arrives,
+    # so that its player histories are fetched by the pool while the next tournament tables are being fetched
+    pids, futures = set(), []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        with click.progressbar(eid_seq, label=f'Fetching {len(eid_seq)} tournament tables:') as bar:
+            for eid in bar:
+                content = _fetch._tourn_table(eid, html_path, base_url=base_url, manifest=manifest)
+                new = _scan._player_ids(content) - pids
+                pids |= new
+                futures += [
+                    pool.submit(_fetch._player, pid, html_path, base_url=base_url, manifest=manifest)
+                    for pid in sorted(new)
+                ]
+        pid_seq = range(1, 1 + max(pids))
+        click.echo(f'Scanning the number of players: {len(pid_seq)}')
+        futures += [
+            pool.submit(_fetch._player, pid, html_path, base_url=base_url, manifest=manifest)
+            for pid in pid_seq
+            if pid not in pids
+        ]
+        with click.progressbar(concurrent.futures.as_completed(futures), length=len(futures), label=f'Fetching {len(pid_seq)} player histories:') as bar:
+            for future in bar:
+                future.result()
+    rat_table = dict(games=0, ntourn=len(eid_seq), items=len(eid_seq)*len(pid_seq), base_url=base_url, manifest=manifest)
+    if not shards:
+        click.echo('Fetching the rating history.')
+        _fetch._rat_table(html_path, **rat_table)
+        _fetch._rat_table_layout(html_path, shards=False)
+        return
+    # many small surname ranges instead of one huge page, merged and deduplicated by _parse._rat_table
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(_fetch._rat_table_shard, from_, till, html_path, **rat_table)
+            for from_, till in _fetch.rat_table_shards
+        ]
+        with click.progressbar(concurrent.futures.as_completed(futures), length=len(futures), label=f'Fetching {len(futures)} rating history shards:') as bar:
+            for future in bar:
+                future.result()
+    _fetch._rat_table_layout(html_path, shards=True)
+
+def _do_parse(html_path: str, pkl_path: str, profile=_profile.passthrough) -> None:
     click.echo('Parsing the list of tournaments.')
-    tournaments = _parse._tournaments(html_path)
+    tournaments = profile(_parse._tournaments, html_path)
     click.echo('Parsing the tournament events, groups, activity, standings and results.')
-    events, groups, activity, standings, results = _parse._tourn_tables(html_path)
+    events, groups, activity, standings, results = profile(_parse._tourn_tables, html_path)
     click.echo('Parsing the player names and expected results.')
-    names, expected = _parse._players(html_path)
+    names, expected = profile(_parse._players, html_path)
     click.echo('Parsing the rating history.')
-    dates, ratings, history = _parse._rat_table(html_path)
+    dates, ratings, history = profile(_parse._rat_table, html_path)
     datasets = [
         tournaments,
         events,
@@ -75,82 +128,181 @@ def _do_parse(html_path: str, pkl_path: str) -> None:
     for key, value in zip(dataset_names, datasets):
         value.to_pickle(os.path.join(pkl_path, key + '.pkl'))
 
-def _do_format(pkl_path: str) -> None:
+def _do_dag(graph: dict, datasets: dict, profile=_profile.passthrough, jobs: int = 4, executor: str = 'thread') -> dict:
+    # the profiler measures one task at a time, and only within this process
+    if profile is not _profile.passthrough:
+        jobs, executor = 1, 'thread'
+    datasets, report = _dag.run(graph, datasets, jobs, executor, profile)
+    click.echo(_dag.summary(report, graph))
+    return datasets
+
+def _do_format(pkl_path: str, profile=_profile.passthrough, jobs: int = 4, executor: str = 'thread') -> None:
     assert os.path.exists(pkl_path)
-    tournaments, events, groups, activity, standings, results, names, expected, dates, ratings, history = tuple(
-        pd.read_pickle(os.path.join(pkl_path, file))
+    datasets = {
+        file: pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
         for file in dataset_names
-    )
-    click.echo('Formatting the list of tournaments.')
-    tournaments = _format._tournaments(tournaments)
-    click.echo('Formatting the tournament events, groups, activity, standings and results.')
-    events      = _format._events(events)
-    groups      = _format._groups(groups)
-    activity    = _format._activity(activity)
-    standings   = _format._standings(standings)
-    results     = _format._results(results)
-    click.echo('Formatting the player names and games.')
-    names       = _format._names(names)
-    expected    = _format._expected(expected)
-    click.echo('Formatting the rating history.')
-    dates       = _format._dates(dates)
-    ratings     = _format._ratings(ratings)
-    history     = _format._history(history)
-    datasets    = [
-        tournaments,
-        events,
-        groups,
-        activity,
-        standings,
-        results,
-        names,
-        expected,
-        dates,
-        ratings,
-        history
-    ]
+    }
+    click.echo(f'Formatting the tournaments, tournament tables, player pages and rating history on {jobs} {executor} workers.')
+    datasets = _do_dag(_dag.format_graph, datasets, profile, jobs, executor)
     os.makedirs(pkl_path, exist_ok=True)
-    for key, value in zip(dataset_names, datasets):
-        value.to_pickle(os.path.join(pkl_path, key + '.pkl'))
+    for key in dataset_names:
+        datasets[key].to_pickle(os.path.join(pkl_path, key + '.pkl'))
 
-def _do_normalize(pkl_path: str) -> None:
+def _do_normalize(pkl_path: str, profile=_profile.passthrough, jobs: int = 4, executor: str = 'thread') -> None:
     assert os.path.exists(pkl_path)
-    tournaments, events, groups, activity, standings, results, names, expected, dates, ratings, history = tuple(
-        pd.read_pickle(os.path.join(pkl_path, file))
+    datasets = {
+        file: pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
         for file in dataset_names
+    }
+    click.echo(f'Normalizing the tournaments, tournament tables, player pages and rating history on {jobs} {executor} workers.')
+    datasets = _do_dag(_dag.normalize_graph, datasets, profile, jobs, executor)
+    os.makedirs(pkl_path, exist_ok=True)
+    for key in dataset_names:
+        datasets[key].to_pickle(os.path.join(pkl_path, key + '.pkl'))
+
+def _do_tiebreaks(standings: pd.DataFrame, results: pd.DataFrame, groups: pd.DataFrame, idx_path: str) -> None:
+    click.echo('Recomputing the standings tie-breaks from the results.')
+    df = tiebreaks.compute(results, groups)
+    mismatches = tiebreaks.mismatches(standings, df)
+    if not mismatches.empty:
+        click.echo(f'Found {len(mismatches.index)} players whose scraped tie-breaks differ from the recomputed ones.')
+    os.makedirs(idx_path, exist_ok=True)
+    df.to_pickle(os.path.join(idx_path, 'tiebreaks.pkl'))
+    mismatches.to_pickle(os.path.join(idx_path, 'tiebreaks_mismatches.pkl'))
+
+def _do_index(pkl_path: str, idx_path: str) -> None:
+    assert os.path.exists(pkl_path)
+    events, groups, activity, standings, results, names, expected, history = tuple(
+        pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in ['events', 'groups', 'activity', 'standings', 'results', 'names', 'expected', 'history']
     )
-    tournaments = _normalize._tournaments(tournaments)
-    events      = _normalize._events(events)
-    groups      = _normalize._groups(groups)
-    names       = _normalize._names(names, standings)
-    dates       = _normalize._dates(dates)
-    ratings     = _normalize._ratings(ratings, names)
-    history     = _normalize._history(history, events, names)
-    activity    = _normalize._activity(activity, names)
-    standings   = _normalize._standings(standings, names)
-    results     = _normalize._results(results, standings)
-    expected    = _normalize._expected(expected, events, names, dates, ratings, results)
+    click.echo('Indexing the head-to-head records.')
+    h2h = headtohead.build(results, expected)
+    click.echo('Indexing the opponent graph.')
+    opponents = graph.build(results)
+    click.echo('Indexing the rating history.')
+    ratings_history = snapshots.build(history, events, activity, names)
+    os.makedirs(idx_path, exist_ok=True)
+    pd.to_pickle(h2h, os.path.join(idx_path, 'headtohead.pkl'))
+    pd.to_pickle(opponents, os.path.join(idx_path, 'graph.pkl'))
+    graph.components(opponents).to_pickle(os.path.join(idx_path, 'components.pkl'))
+    pd.to_pickle(ratings_history, os.path.join(idx_path, 'snapshots.pkl'))
+    click.echo('Writing the player x event rating matrices.')
+    matrix.write(history, events, idx_path)
+    matrix.write(history, events, idx_path, fill=True)
+    _do_tiebreaks(standings, results, groups, idx_path)
+    click.echo('Indexing the player form features.')
+    features.save(features.build(results, activity, events), idx_path)
+
+def _do_transform(html_path: str, pkl_path: str, idx_path: str, profile=_profile.passthrough, jobs: int = 4, executor: str = 'thread') -> None:
+    sources = _incremental.sources(html_path)
+    _do_parse(html_path, pkl_path, profile)
+    _do_format(pkl_path, profile, jobs, executor)
+    _do_normalize(pkl_path, profile, jobs, executor)
+    _do_index(pkl_path, idx_path)
+    _incremental.save(pkl_path, sources)
+
+def _do_chunked(html_path: str, pkl_path: str, idx_path: str, batch_mb: int, profile=_profile.passthrough) -> None:
+    sources = _incremental.sources(html_path)
+    _chunked.clear(pkl_path)
     os.makedirs(pkl_path, exist_ok=True)
-    datasets = [
-        tournaments,
-        events,
-        groups,
-        activity,
-        standings,
-        results,
-        names,
-        expected,
-        dates,
-        ratings,
-        history
-    ]
-    for key, value in zip(dataset_names, datasets):
+    click.echo('Transforming the list of tournaments.')
+    tournaments = profile(_normalize._tournaments, profile(_format._tournaments, profile(_parse._tournaments, html_path)))
+    click.echo(f'Parsing and formatting the tournament tables in batches of about {batch_mb} MB at their peak.')
+    players = _chunked.tourn_tables(html_path, pkl_path, batch_mb * 2**20, profile)
+    click.echo(f'Parsing and formatting the player pages in batches of about {batch_mb} MB at their peak.')
+    names = _chunked.players(html_path, pkl_path, batch_mb * 2**20, profile)
+    names = profile(_normalize._names, names, players)
+    click.echo('Normalizing the tournament tables per batch.')
+    _chunked.normalize_tourn_tables(pkl_path, names, profile)
+    events = profile(_normalize._events, _chunked.consolidate(pkl_path, 'events'))
+    click.echo('Transforming the rating history.')
+    dates, ratings, history = profile(_parse._rat_table, html_path)
+    dates   = profile(_normalize._dates, profile(_format._dates, dates))
+    ratings = profile(_normalize._ratings, profile(_format._ratings, ratings), names)
+    history = profile(_normalize._history, profile(_format._history, history), events, names)
+    click.echo('Normalizing the expected results per batch.')
+    _chunked.normalize_expected(pkl_path, events, names, ratings, profile)
+    click.echo('Consolidating the batches, one dataset at a time.')
+    for name, order in [
+        ('groups'   , None            ),
+        ('activity' , ['pid', 'eid']  ),
+        ('standings', None            ),
+        ('results'  , None            ),
+        ('expected' , ['pid1', 'pid2'])
+    ]:
+        _chunked.consolidate(pkl_path, name, order)
+    _chunked.clear(pkl_path)
+    for key, value in zip(['tournaments', 'names', 'dates', 'ratings', 'history'], [tournaments, names, dates, ratings, history]):
+        value.to_pickle(os.path.join(pkl_path, key + '.pkl'))
+    del tournaments, names, dates, ratings, history
+    _do_index(pkl_path, idx_path)
+    _incremental.save(pkl_path, sources)
+
+def _do_update(html_path: str, pkl_path: str, idx_path: str, profile=_profile.passthrough) -> None:
+    old, new = _incremental.load(pkl_path), _incremental.sources(html_path)
+    if old is None:
+        click.echo('No previous transform found, falling back to a full transform.')
+        return _do_transform(html_path, pkl_path, idx_path, profile)
+    if old == new:
+        click.echo('No changed pages found, nothing to update.')
+        return
+    eid_seq, pid_seq, rat_table = _incremental.changes(old, new)
+    click.echo(f'Updating {len(eid_seq)} tournaments, {len(pid_seq)} players' + (' and the rating history.' if rat_table else '.'))
+    tables = {
+        file: pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in dataset_names
+    }
+    # games of events that are newer than all previous ones can be added to the indexes, otherwise they are rebuilt
+    appended = bool(eid_seq) and min(eid_seq) > tables['events'].eid.max()
+    tables = _incremental.update(html_path, tables, eid_seq, pid_seq, rat_table, profile)
+    for key, value in tables.items():
         value.to_pickle(os.path.join(pkl_path, key + '.pkl'))
+    if appended and os.path.exists(os.path.join(idx_path, 'headtohead.pkl')):
+        click.echo('Updating the head-to-head records and the opponent graph.')
+        results = tables['results'].query('eid in @eid_seq')
+        h2h = headtohead.update(pd.read_pickle(os.path.join(idx_path, 'headtohead.pkl')), results, tables['expected'])
+        opponents = graph.update(pd.read_pickle(os.path.join(idx_path, 'graph.pkl')), results)
+        click.echo('Indexing the rating history.')
+        ratings_history = snapshots.build(tables['history'], tables['events'], tables['activity'], tables['names'])
+        pd.to_pickle(h2h, os.path.join(idx_path, 'headtohead.pkl'))
+        pd.to_pickle(opponents, os.path.join(idx_path, 'graph.pkl'))
+        graph.components(opponents).to_pickle(os.path.join(idx_path, 'components.pkl'))
+        pd.to_pickle(ratings_history, os.path.join(idx_path, 'snapshots.pkl'))
+        click.echo('Writing the player x event rating matrices.')
+        matrix.write(tables['history'], tables['events'], idx_path)
+        matrix.write(tables['history'], tables['events'], idx_path, fill=True)
+        _do_tiebreaks(tables['standings'], tables['results'], tables['groups'], idx_path)
+        click.echo('Updating the player form features.')
+        store = features.load(idx_path)
+        features.save(
+            features.build(tables['results'], tables['activity'], tables['events']) if store is None else
+            features.update(store, results, tables['activity'].query('eid in @eid_seq'), tables['events']),
+            idx_path
+        )
+    else:
+        _do_index(pkl_path, idx_path)
+    _incremental.save(pkl_path, new)
 
-def _do_transform(html_path: str, pkl_path: str) -> None:
-    _do_parse(html_path, pkl_path)
-    _do_format(pkl_path)
-    _do_normalize(pkl_path)
+def _do_benchmark(html_path: str, history_file: str, scale: float, seed: int, repeat: int, memory: bool, threshold: float) -> bool:
+    if not _store.exists(html_path, 'tournaments.html'):
+        click.echo(f'Generating a synthetic archive at scale {scale}.')
+        _corpus.write(_corpus.simulate(scale, seed), html_path)
+    click.echo('Benchmarking the extract, parse, format and normalize stages.')
+    df = _suite.record(history_file, _suite.run(html_path, repeat, memory), scale=scale, seed=seed)
+    # the share of every function in the run time of its stage, e.g. of _normalize._expected among the normalizers
+    click.echo(df
+        .assign(
+            share   = lambda x: x.seconds / x.groupby('stage').seconds.transform('sum'),
+            peak_MB = lambda x: x.peak_bytes / 2**20
+        )
+        .drop(columns='peak_bytes')
+        .to_string(index=False, float_format='{:.3f}'.format)
+    )
+    regressions = df.query('ratio > @threshold')
+    for function in regressions.function:
+        click.echo(f'Regression: {function} is more than {threshold}x slower than the previous run.')
+    return regressions.empty
 
 @click.group()
 def kleier():
@@ -170,13 +322,116 @@ Do you want to continue?"""
     type=click.Path(writable=True),
     default='data/html',
     show_default=True,
-    help='PATH is the directory where all .html files will be saved to.'
+    help='PATH is the directory (or the .pack file) where all .html files will be saved to.'
+)
+@click.option(
+    '-U', '--base-url',
+    default=_fetch.base_url,
+    show_default=True,
+    help='URL is the site where all .html files will be fetched from, e.g. a local kleier serve.'
+)
+@click.option(
+    '--resume/--no-resume',
+    default=False,
+    show_default=True,
+    help='Skip files that are verified against the manifest, and only fetch missing or corrupt ones.'
+)
+@click.option(
+    '-j', '--jobs',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='JOBS is the number of player histories (and rating history shards) that are fetched concurrently.'
+)
+@click.option(
+    '--shards/--no-shards',
+    default=True,
+    show_default=True,
+    help='Fetch the rating history in surname ranges, instead of as one page.'
 )
-def extract(html_path) -> None:
+def extract(html_path, base_url, resume, jobs, shards) -> None:
     """
     Extract all Classic Stratego data from https://www.kleier.net/.
     """
-    _do_extract(html_path)
+    _do_extract(html_path, base_url, resume, jobs, shards)
+
+@kleier.command()
+@click.option(
+    '-H', '--html-path',
+    type=click.Path(exists=True),
+    default='data/html',
+    show_default=True,
+    help='PATH is the directory (or the .pack file) where all .html files will be copied from.'
+)
+@click.option(
+    '-o', '--output',
+    type=click.Path(writable=True),
+    default='data/html.pack',
+    show_default=True,
+    help='PATH is the .pack file (or the directory) where all .html files will be copied to.'
+)
+def pack(html_path, output) -> None:
+    """
+    Copy all extracted .html files into a compressed pack file, or back.
+    """
+    assert os.path.abspath(html_path) != os.path.abspath(output)
+    count = _store.copy(html_path, output)
+    click.echo(f'Copied {count} files from {html_path} to {output}.')
+
+@kleier.command()
+@click.option(
+    '-H', '--html-path',
+    type=click.Path(exists=True),
+    default='data/html',
+    show_default=True,
+    help='PATH is the directory where all .html files will be served from.'
+)
+@click.option(
+    '--host',
+    default='localhost',
+    show_default=True,
+    help='HOST is the address the server will listen on.'
+)
+@click.option(
+    '-p', '--port',
+    type=int,
+    default=8000,
+    show_default=True,
+    help='PORT is the port the server will listen on.'
+)
+@click.option(
+    '-l', '--latency',
+    type=float,
+    default=0.0,
+    show_default=True,
+    help='LATENCY is the delay in seconds before every response.'
+)
+@click.option(
+    '-e', '--error-rate',
+    type=float,
+    default=0.0,
+    show_default=True,
+    help='RATE is the fraction of requests that will fail with 503 Service Unavailable.'
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=0,
+    show_default=True,
+    help='SEED determines which requests will fail.'
+)
+def serve(html_path, host, port, latency, error_rate, seed) -> None:
+    """
+    Serve extracted Classic Stratego data as a local stand-in for https://www.kleier.net/.
+    """
+    server = _server.server(html_path, host, port, latency, error_rate, seed)
+    click.echo(f'Serving {html_path} on http://{host}:{port}/ (press CTRL+C to quit).')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 @kleier.command()
 @click.option(
@@ -193,8 +448,421 @@ def extract(html_path) -> None:
     show_default=True,
     help='PATH is the directory where all .pkl files will be saved to.'
 )
-def transform(html_path, pkl_path) -> None:
+@click.option(
+    '-I', '--idx-path',
+    type=click.Path(writable=True),
+    default='data/idx',
+    show_default=True,
+    help='PATH is the directory where all index .pkl files will be saved to.'
+)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help='Report the wall time and rows in/out of every parse, format and normalize function, '
+         'and the peak memory of its Python allocations if --cprofile-dir is given.'
+)
+@click.option(
+    '--profile-json',
+    type=click.Path(writable=True),
+    default=None,
+    help='FILE is the JSON file where the profile will be saved to.'
+)
+@click.option(
+    '--cprofile-dir',
+    type=click.Path(writable=True),
+    default=None,
+    help='PATH is the directory where a cProfile dump of every profiled call will be saved to.'
+)
+@click.option(
+    '-i', '--incremental',
+    is_flag=True,
+    default=False,
+    help='Only reprocess the tournaments and players whose pages changed since the previous transform.'
+)
+@click.option(
+    '-c', '--chunked',
+    is_flag=True,
+    default=False,
+    help='Process the tournaments and players in batches that are written to partitions under PKL_PATH/parts.'
+)
+@click.option(
+    '-b', '--batch-mb',
+    type=click.IntRange(min=1),
+    default=256,
+    show_default=True,
+    metavar='MB',
+    help='MB is the estimated peak memory of parsing and formatting one batch of a chunked transform. '
+         'This is a batch size hint, not a memory budget: consolidating and indexing still load all the datasets.'
+)
+@click.option(
+    '-j', '--jobs',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='JOBS is the number of datasets that are formatted or normalized concurrently.'
+)
+@click.option(
+    '--executor',
+    type=click.Choice(['thread', 'process']),
+    default='thread',
+    show_default=True,
+    help='Run the concurrent format and normalize tasks on a thread pool or on a process pool.'
+)
+def transform(html_path, pkl_path, idx_path, profile, profile_json, cprofile_dir, incremental, chunked, batch_mb, jobs, executor) -> None:
     """
     Transform all Classic Stratego data into a normalized RDBS.
     """
-    _do_transform(html_path, pkl_path)
+    if incremental and chunked:
+        raise click.UsageError('--incremental and --chunked are mutually exclusive.')
+    profiler = _profile.Profiler(cprofile_dir) if profile or profile_json or cprofile_dir else _profile.passthrough
+    if chunked:
+        _do_chunked(html_path, pkl_path, idx_path, batch_mb, profiler)
+    elif incremental:
+        _do_update(html_path, pkl_path, idx_path, profiler)
+    else:
+        _do_transform(html_path, pkl_path, idx_path, profiler, jobs, executor)
+    if profiler is _profile.passthrough:
+        return
+    click.echo(profiler
+        .table()
+        .assign(
+            peak_MB            = lambda x: x.peak_bytes / 2**20,
+            process_max_RSS_MB = lambda x: x.process_max_rss_kb / 2**10
+        )
+        .drop(columns=['peak_bytes', 'process_max_rss_kb'])
+        .to_string(index=False, float_format='{:.3f}'.format)
+    )
+    if profile_json:
+        profiler.to_json(profile_json)
+
+@kleier.command()
+@click.option(
+    '-P', '--pkl-path',
+    type=click.Path(exists=True),
+    default='data/pkl',
+    show_default=True,
+    help='PATH is the directory where all .pkl files will be read from.'
+)
+@click.option(
+    '-f', '--format',
+    type=click.Choice(['sqlite', 'duckdb']),
+    default='sqlite',
+    show_default=True,
+    help='FORMAT is the database format that will be written.'
+)
+@click.option(
+    '-o', '--output',
+    type=click.Path(writable=True),
+    default=None,
+    help='OUTPUT is the database file that will be written.  [default: data/kleier.FORMAT]'
+)
+def export(pkl_path, format, output) -> None:
+    """
+    Export the normalized RDBS to a SQLite or DuckDB database.
+    """
+    output = output or os.path.join('data', f'kleier.{format}')
+    click.echo(f'Exporting the normalized RDBS to {output}.')
+    _sql.export(pkl_path, output, format)
+
+@kleier.command()
+@click.option(
+    '-P', '--pkl-path',
+    type=click.Path(exists=True),
+    default='data/pkl',
+    show_default=True,
+    help='PATH is the directory where all .pkl files will be read from.'
+)
+@click.option(
+    '-e', '--eid',
+    type=int,
+    required=True,
+    help='EID is the event of the group that will be simulated.'
+)
+@click.option(
+    '-g', '--gid',
+    type=int,
+    default=0,
+    show_default=True,
+    help='GID is the group within the event that will be simulated.'
+)
+@click.option(
+    '-n', '--runs',
+    type=int,
+    default=100_000,
+    show_default=True,
+    help='RUNS is the number of simulations of the group.'
+)
+@click.option(
+    '-j', '--jobs',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='JOBS is the number of worker processes that run the batches of simulations.'
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=0,
+    show_default=True,
+    help='SEED is the random seed of the simulations.'
+)
+def simulate(pkl_path, eid, gid, runs, jobs, seed) -> None:
+    """
+    Forecast the final ranks of a group by Monte Carlo simulation.
+    """
+    groups, standings, names, expected, ratings, results = tuple(
+        pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in ['groups', 'standings', 'names', 'expected', 'ratings', 'results']
+    )
+    click.echo(f'Simulating group {gid} of event {eid} {runs} times on {jobs} workers.')
+    df = forecast.forecast(eid, gid, groups, standings, expected, ratings, results, runs, jobs, seed)
+    click.echo(df
+        .reset_index()
+        .merge(names.loc[:, ['pid', 'pre', 'sur']], how='left', on='pid', validate='one_to_one')
+        .set_index(['pid', 'pre', 'sur'])
+        .to_string(float_format='{:.3f}'.format)
+    )
+
+@kleier.command()
+@click.option(
+    '-P', '--pkl-path',
+    type=click.Path(exists=True),
+    default='data/pkl',
+    show_default=True,
+    help='PATH is the directory where all .pkl files will be read from.'
+)
+@click.option(
+    '-I', '--idx-path',
+    type=click.Path(),
+    default='data/idx',
+    show_default=True,
+    help='PATH is the directory where the fitted strengths will be saved to.'
+)
+@click.option(
+    '-l', '--link',
+    type=click.Choice(list(strengths.links)),
+    default='norm',
+    show_default=True,
+    help='LINK is the distribution of the expected score: norm (Thurstone) or logistic (Bradley-Terry).'
+)
+@click.option(
+    '--decay/--no-decay',
+    default=False,
+    show_default=True,
+    help='Weight every game with the date significance of its event.'
+)
+@click.option(
+    '--mu',
+    type=float,
+    default=1500.0,
+    show_default=True,
+    help='MU is the mean of the normal prior of all strengths.'
+)
+@click.option(
+    '--sigma',
+    type=float,
+    default=400.0,
+    show_default=True,
+    help='SIGMA is the standard deviation of the normal prior of all strengths.'
+)
+@click.option(
+    '--se/--no-se',
+    default=True,
+    show_default=True,
+    help='Compute the standard errors of the strengths.'
+)
+def fit(pkl_path, idx_path, link, decay, mu, sigma, se) -> None:
+    """
+    Fit the strengths of all players at once to all results.
+    """
+    events, results, names = tuple(
+        pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in ['events', 'results', 'names']
+    )
+    click.echo(f'Fitting the strengths of all players with a {link} link' + (' and date significance weights.' if decay else '.'))
+    df = strengths.fit(results, events, link, decay, mu, sigma, se)
+    os.makedirs(idx_path, exist_ok=True)
+    df.to_pickle(os.path.join(idx_path, 'strengths.pkl'))
+    click.echo(df
+        .merge(names.loc[:, ['pid', 'pre', 'sur']], how='left', on='pid', validate='one_to_one')
+        .sort_values('R', ascending=False)
+        .head(20)
+        .to_string(index=False, float_format='{:.1f}'.format)
+    )
+
+@kleier.command(name='replay')
+@click.option(
+    '-P', '--pkl-path',
+    type=click.Path(exists=True),
+    default='data/pkl',
+    show_default=True,
+    help='PATH is the directory where all .pkl files will be read from.'
+)
+@click.option(
+    '-I', '--idx-path',
+    type=click.Path(),
+    default='data/idx',
+    show_default=True,
+    help='PATH is the directory where the replayed ratings will be saved to.'
+)
+@click.option(
+    '-s', '--system',
+    type=click.Choice(list(replay.systems)),
+    multiple=True,
+    default=list(replay.systems),
+    show_default=True,
+    help='SYSTEM is a rating system that will be replayed, and can be repeated.'
+)
+def replay_systems(pkl_path, idx_path, system) -> None:
+    """
+    Replay all events with alternative rating systems side by side.
+    """
+    events, results = tuple(
+        pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in ['events', 'results']
+    )
+    os.makedirs(idx_path, exist_ok=True)
+    records = []
+    for name in system:
+        click.echo(f'Replaying all events with {name}.')
+        start = time.perf_counter()
+        replayed = replay.replay(results, events, name)
+        seconds = time.perf_counter() - start
+        pd.to_pickle(replayed, os.path.join(idx_path, f'replay-{name}.pkl'))
+        records.append({
+            'system' : name,
+            'seconds': seconds,
+            **replay.metrics(replayed.games.W.to_numpy(dtype=float), replayed.games.We.to_numpy())
+        })
+    click.echo(pd.DataFrame(records).to_string(index=False, float_format='{:.4f}'.format))
+
+def _parse_values(text: str) -> list:
+    # e.g. 'K=10,20' or 'link=norm,logistic' or 'decay=none,2.5731'
+    def value(item: str):
+        if item.lower() == 'none':
+            return None
+        try:
+            return float(item)
+        except ValueError:
+            return item
+    return [value(item) for item in text.split(',')]
+
+@kleier.command(name='backtest')
+@click.option(
+    '-P', '--pkl-path',
+    type=click.Path(exists=True),
+    default='data/pkl',
+    show_default=True,
+    help='PATH is the directory where all .pkl files will be read from.'
+)
+@click.option(
+    '-s', '--system',
+    type=click.Choice(list(replay.systems)),
+    default='elo',
+    show_default=True,
+    help='SYSTEM is the rating system whose parameters will be swept.'
+)
+@click.option(
+    '-p', '--param',
+    multiple=True,
+    help='PARAM is a NAME=VALUE,... list of parameter values to sweep, e.g. K=10,20,40, and can be repeated.'
+)
+@click.option(
+    '-w', '--warmup',
+    type=click.IntRange(min=0),
+    default=100,
+    show_default=True,
+    help='WARMUP is the number of events that are replayed but not scored.'
+)
+@click.option(
+    '-j', '--jobs',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='JOBS is the number of worker processes that run the configurations.'
+)
+def backtest_grid(pkl_path, system, param, warmup, jobs) -> None:
+    """
+    Backtest the walk-forward predictions of a grid of rating system parameters.
+    """
+    events, results = tuple(
+        pd.read_pickle(os.path.join(pkl_path, file + '.pkl'))
+        for file in ['events', 'results']
+    )
+    # a misspelled parameter would otherwise be silently ignored, and sweep identical configurations
+    values = {}
+    for text in param:
+        name, sep, items = text.partition('=')
+        if not sep or name not in replay.systems[system].params:
+            raise click.BadParameter(
+                f'{text!r} is not a NAME=VALUE,... list with a parameter of {system}: {", ".join(replay.systems[system].params)}.',
+                param_hint="'-p' / '--param'"
+            )
+        values[name] = _parse_values(items)
+    played = replay.games(results, events).eid.nunique()
+    if warmup >= played:
+        raise click.BadParameter(f'{warmup} is not less than the {played} events with played games.', param_hint="'-w' / '--warmup'")
+    configs = backtest.grid(system, **values)
+    click.echo(f'Backtesting {len(configs)} configurations of {system} on {jobs} workers.')
+    click.echo(backtest
+        .backtest(results, events, configs, jobs, warmup)
+        .sort_values('log_loss')
+        .to_string(index=False, float_format='{:.4f}'.format)
+    )
+
+@kleier.command()
+@click.option(
+    '-s', '--scale',
+    type=float,
+    default=0.1,
+    show_default=True,
+    help='SCALE is the size of the synthetic archive relative to the real one.'
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=0,
+    show_default=True,
+    help='SEED is the random seed of the synthetic archive.'
+)
+@click.option(
+    '-H', '--html-path',
+    type=click.Path(writable=True),
+    default=None,
+    help='PATH is the directory where all synthetic .html files will be saved to.  [default: data/bench/html-SCALE-SEED]'
+)
+@click.option(
+    '-J', '--json-file',
+    type=click.Path(writable=True),
+    default='data/bench/history.json',
+    show_default=True,
+    help='FILE is the JSON history where all timings will be appended to.'
+)
+@click.option(
+    '-r', '--repeat',
+    type=int,
+    default=1,
+    show_default=True,
+    help='REPEAT is the number of timed runs of each function, of which the best is reported.'
+)
+@click.option(
+    '--memory/--no-memory',
+    default=True,
+    show_default=True,
+    help='Measure the peak memory of each function in a separate traced run.'
+)
+@click.option(
+    '-t', '--threshold',
+    type=float,
+    default=1.25,
+    show_default=True,
+    help='THRESHOLD is the slowdown relative to the previous run that counts as a regression.'
+)
+@click.pass_context
+def benchmark(ctx, scale, seed, html_path, json_file, repeat, memory, threshold) -> None:
+    """
+    Benchmark the transformation of a synthetic Classic Stratego archive.
+    """
+    html_path = html_path or os.path.join('data', 'bench', f'html-{scale}-{seed}')
+    if not _do_benchmark(html_path, json_file, scale, seed, repeat, memory, threshold):
+        ctx.exit(1)